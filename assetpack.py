@@ -0,0 +1,132 @@
+"""Prebaked pack of scaled, display-format images loaded through mmap.
+
+Run `python assetpack.py` to bake data/assets.pack. At startup open_pack() maps
+it and LOADED_IMAGES builds Surfaces straight over the mapped pixels, with no
+PNG decoding and no rescaling. The pack records the size and modification
+time of every source image and is ignored once any of them change, until it
+is baked again."""
+
+import json
+import mmap
+import os
+import struct
+
+import pygame as pg
+
+from helper import DATA_DIR, image_name, image_paths, load_scaled_image
+
+PACK_PATH = os.path.join(DATA_DIR, "assets.pack")
+MAGIC = b"FWPK"
+VERSION = 2
+# magic, version, length of the json index that follows
+HEADER = struct.Struct("<4sII")
+COLORKEY = (0, 0, 0, 255)
+
+
+def source_stamp():
+    """Path, scale, size and mtime of every source image; only stats the files"""
+    stamp = []
+    for image_path, scale in image_paths():
+        stat = os.stat(image_path)
+        stamp.append(
+            [
+                os.path.relpath(image_path, DATA_DIR),
+                scale,
+                stat.st_size,
+                stat.st_mtime_ns,
+            ]
+        )
+    return stamp
+
+
+def pixel_format(surface):
+    """frombuffer/tostring format name matching the surface's byte order"""
+    if surface.get_masks()[0] == 0xFF0000:
+        return "BGRA"
+    return "RGBA"
+
+
+def bake(path=PACK_PATH):
+    """Write every image, scaled and converted, to one pack file"""
+    images = {}
+    chunks = []
+    offset = 0
+    fmt = None
+    for image_path, scale in image_paths():
+        image = load_scaled_image(image_path, scale)
+        fmt = fmt or pixel_format(image)
+        data = pg.image.tostring(image, fmt)
+        images[image_name(image_path)] = [offset, image.get_width(), image.get_height()]
+        chunks.append(data)
+        offset += len(data)
+
+    index = json.dumps(
+        {
+            "sources": source_stamp(),
+            "format": fmt,
+            "colorkey": COLORKEY,
+            "images": images,
+        }
+    ).encode()
+    with open(path, "wb") as pack_file:
+        pack_file.write(HEADER.pack(MAGIC, VERSION, len(index)))
+        pack_file.write(index)
+        for chunk in chunks:
+            pack_file.write(chunk)
+
+
+def read_index(pack_file):
+    magic, version, index_size = HEADER.unpack(pack_file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        return None, 0
+    return json.loads(pack_file.read(index_size)), HEADER.size + index_size
+
+
+class AssetPack:
+    def __init__(self, path, index, data_start):
+        self.index = index
+        self.data_start = data_start
+        self.file = open(path, "rb")
+        # copy-on-write so pygame never needs to touch the file itself
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.buffer = memoryview(self.map)
+
+    def __contains__(self, name):
+        return name in self.index["images"]
+
+    def load(self, name):
+        offset, width, height = self.index["images"][name]
+        start = self.data_start + offset
+        image = pg.image.frombuffer(
+            self.buffer[start : start + width * height * 4],
+            (width, height),
+            self.index["format"],
+        )
+        image.set_colorkey(self.index["colorkey"], pg.RLEACCEL)
+        return image
+
+    def sizes(self):
+        return {
+            name: (width, height)
+            for name, (_, width, height) in self.index["images"].items()
+        }
+
+
+def open_pack(path=PACK_PATH):
+    """The baked pack, or None if it is missing or older than the source images"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as pack_file:
+        index, data_start = read_index(pack_file)
+    if index is None or index["sources"] != source_stamp():
+        print("Asset pack is out of date, run assetpack.py to rebuild it")
+        return None
+    return AssetPack(path, index, data_start)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    bake()
+    print("Baked", len(image_paths()), "images to", PACK_PATH)
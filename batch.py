@@ -0,0 +1,116 @@
+import time
+
+import pygame as pg
+import pygame.surfarray as surfarray
+
+from helper import LOADED_IMAGES
+
+ATLAS_WIDTH = 1024
+ATLASES = {}
+
+
+class SpriteAtlas:
+    """Sprites packed onto one surface in shelves, with the area of each by name"""
+
+    def __init__(self, names, width=ATLAS_WIDTH):
+        names = sorted(set(names), key=lambda name: -LOADED_IMAGES[name].get_height())
+        self.areas = {}
+        x = y = shelf_height = 0
+        for name in names:
+            w, h = LOADED_IMAGES[name].get_size()
+            if x + w > width:
+                x = 0
+                y += shelf_height
+                shelf_height = 0
+            self.areas[name] = pg.Rect(x, y, w, h)
+            x += w
+            shelf_height = max(shelf_height, h)
+
+        size = (width, max(1, y + shelf_height))
+        self.surface = pg.Surface(size, pg.SRCALPHA).convert_alpha()
+        for name, area in self.areas.items():
+            copy_pixels(LOADED_IMAGES[name], self.surface, area)
+        # run-length encode the transparent gaps, as load_image does for sprites
+        self.surface.set_alpha(255, pg.RLEACCEL)
+
+    def __contains__(self, name):
+        return name in self.areas
+
+
+def copy_pixels(image, atlas, area):
+    """Copy image's colors and alpha into the atlas unblended.
+
+    The sprites' colorkey is not copied: SDL ignores it when blitting RLE
+    surfaces with per-pixel alpha, so alpha alone decides what is drawn."""
+    rgb = surfarray.array3d(image)
+    alpha = surfarray.array_alpha(image)
+    surfarray.pixels3d(atlas)[area.left : area.right, area.top : area.bottom] = rgb
+    surfarray.pixels_alpha(atlas)[
+        area.left : area.right, area.top : area.bottom
+    ] = alpha
+
+
+def get_atlas(key, names):
+    """Atlas shared by every world drawing the sprites of key, e.g. a theme"""
+    if key not in ATLASES:
+        ATLASES[key] = SpriteAtlas(names)
+    return ATLASES[key]
+
+
+class SpriteBatch:
+    """Collects a frame's blits and submits them with one Surface.blits call.
+
+    Sprites found in the atlas are drawn as areas of the atlas surface, anything
+    else straight from LOADED_IMAGES."""
+
+    def __init__(self, atlas=None):
+        self.atlas = atlas
+        self.commands = []
+        self.names = []
+        self.blit_count = 0
+        self.blit_seconds = 0
+
+    def add(self, name, position):
+        if self.atlas is not None and name in self.atlas:
+            self.commands.append((self.atlas.surface, position, self.atlas.areas[name]))
+        else:
+            self.commands.append((LOADED_IMAGES[name], position))
+        self.names.append(name)
+
+    def add_enemies(self, enemies, dims):
+        """Queue every enemy of an EnemyStore straight from its arrays"""
+        indices, positions = enemies.draw_positions(dims)
+        names = enemies.sprite_names(indices).tolist()
+        surface = self.atlas.surface if self.atlas is not None else None
+        areas = self.atlas.areas if self.atlas is not None else {}
+        self.commands += [
+            (
+                (surface, position, areas[name])
+                if name in areas
+                else (LOADED_IMAGES[name], position)
+            )
+            for name, position in zip(names, positions.tolist())
+        ]
+        self.names += names
+
+    def add_entity(self, entity, dims):
+        name = entity.get_sprite_id()
+        for position in entity.draw_positions(dims):
+            self.add(name, position)
+
+    def flush(self, surface):
+        """Draw everything queued; returns (rect, sprite name) for each blit"""
+        start = time.perf_counter()
+        rects = surface.blits(self.commands)
+        self.blit_seconds += time.perf_counter() - start
+        self.blit_count += len(self.commands)
+        drawn = list(zip(rects, self.names))
+        self.commands = []
+        self.names = []
+        return drawn
+
+    def throughput(self):
+        """Blits per second over everything flushed so far"""
+        if not self.blit_seconds:
+            return 0
+        return self.blit_count / self.blit_seconds
@@ -0,0 +1,149 @@
+"""Cost of generating a background with the tile grid against the old per-cell way.
+
+legacy_render_background is create_background's generator as it was before:
+the roads padded to one glyph per pixel, an if/elif chain and a blit per cell,
+then the whole surface scaled to the world size. Both get the same seed; the
+report also has how far apart their pictures are, since the new one draws the
+tiles at their stretched size instead of scaling the finished surface.
+
+Run from the project directory: python benchmarks/backgrounds.py"""
+
+import json
+import os
+import random
+import sys
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame as pg
+
+import helper
+from helper import LOADED_IMAGES, render_background
+from layout import Layout
+
+THEMES = ["VIKING", "PRIEST", "FARMER", "DEMON"]
+# the menu, then the worlds of matches with this many players
+PLAYER_COUNTS = [2, 4, 8]
+REPEAT = 5
+NUMBER = 5
+
+
+def legacy_render_background(name, world_size, rng):
+    roads = [
+        "           |    ",
+        "           |    ",
+        "---D    R--L  R-",
+        "   U-D 123    | ",
+        "     U-456----L ",
+        "       789      ",
+        "        |       ",
+        "        U--D    ",
+        "           |    ",
+    ]
+    for i in range(len(roads)):
+        while len(roads[i]) < int(world_size[0]):
+            roads[i] = roads[i] + roads[i][-1]
+    while len(roads) < int(world_size[1]):
+        roads.append("           |    " + " " * (int(world_size[0]) - 16))
+
+    feature_counts = {"FARMER": 22, "DEMON": 19, "PRIEST": 17, "VIKING": 21}
+    dims = (world_size[0] // 48, world_size[1] // 48)
+    adjusted_world_size = [
+        world_size[0] - world_size[0] % 48,
+        world_size[1] - world_size[1] % 48,
+    ]
+    bg = pg.Surface(adjusted_world_size)
+    for i in range(dims[0]):
+        for j in range(dims[1]):
+            if roads[j][i] == " ":
+                tile = rng.choice(["43", "52"])
+            elif roads[j][i] == "-":
+                tile = "41"
+            elif roads[j][i] == "|":
+                tile = "38"
+            elif roads[j][i] == "U":
+                tile = "34"
+            elif roads[j][i] == "R":
+                tile = "28"
+            elif roads[j][i] == "L":
+                tile = "36"
+            elif roads[j][i] == "D":
+                tile = "30"
+            elif roads[j][i] == "2":
+                tile = "11"
+            elif roads[j][i] == "4":
+                tile = "13"
+            elif roads[j][i] == "6":
+                tile = "15"
+            elif roads[j][i] == "8":
+                tile = "17"
+            elif roads[j][i].isdigit():
+                tile = str(18 + int(roads[j][i]))
+
+            bg.blit(LOADED_IMAGES[name[0] + tile], (i * 48, j * 48))
+    for i in range(dims[0] - 1):
+        for j in range(dims[1] - 1):
+            if roads[j][i] == " " and rng.random() > 0.95:
+                num = str(rng.randint(1, feature_counts[name]))
+                if len(num) == 1:
+                    num = "0" + num
+                img = LOADED_IMAGES[name[0] + "E" + num]
+                rect = img.get_rect(topleft=(i * 48, j * 48))
+                bg.blit(img, rect)
+
+    return pg.transform.scale(bg, world_size)
+
+
+def ms_per_call(function, world_size):
+    calls = [0]
+
+    def generate():
+        calls[0] += 1
+        for theme in THEMES:
+            function(theme, world_size, random.Random(calls[0]))
+
+    seconds = min(timeit.repeat(generate, number=NUMBER, repeat=REPEAT))
+    return round(seconds / NUMBER / len(THEMES) * 1000, 3)
+
+
+def difference(world_size):
+    """Mean absolute channel difference of the two pictures, 0 to 255"""
+    total = 0.0
+    for seed, theme in enumerate(THEMES):
+        old = legacy_render_background(theme, world_size, random.Random(seed))
+        new = render_background(theme, world_size, random.Random(seed))
+        total += np.abs(
+            pg.surfarray.pixels3d(old).astype(np.int16)
+            - pg.surfarray.pixels3d(new).astype(np.int16)
+        ).mean()
+    return round(total / len(THEMES), 3)
+
+
+def main():
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    LOADED_IMAGES.prefetch(LOADED_IMAGES.paths)
+    sizes = {"menu": helper.WIN_SIZE}
+    for count in PLAYER_COUNTS:
+        sizes["players_{}".format(count)] = Layout(helper.WIN_SIZE, count).world_size()
+
+    results = {}
+    for label, world_size in sizes.items():
+        # warm the scaled tile cache, as every background after the first does
+        for theme in THEMES:
+            render_background(theme, world_size, random.Random(0))
+        results[label] = {
+            "world_size": list(world_size),
+            "legacy_ms": ms_per_call(legacy_render_background, world_size),
+            "tile_grid_ms": ms_per_call(render_background, world_size),
+            "mean_abs_difference": difference(world_size),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Memory and hot method cost of the slotted Entity against a dict-backed Sprite.
+
+DictEntity is the Entity this game used before: a pg.sprite.Sprite keeping its
+attributes in a __dict__ and looking its size up in LOADED_IMAGES on every call.
+
+Run from the project directory: python benchmarks/entities.py"""
+
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+
+import helper
+from entity import Entity
+from helper import get_image_size
+
+ENTITY_COUNT = 10000
+CALLS = 100000
+WORLD_SIZE = ((512 * 3) // 2, (288 * 3))
+
+
+class DictEntity(pg.sprite.Sprite):
+    def __init__(self, sprite_dict, position, lives=3, speed=2, ai=None):
+        pg.sprite.Sprite.__init__(self)
+        self.image = "DOWN"
+        self.sprite_dict = sprite_dict
+        x, y = list(position)
+        self.position = [x - self.get_width() / 2, y - self.get_height() / 2]
+        self.lives = lives
+        self.max_lives = lives
+        self.speed = speed
+        self.ai = ai
+        self.info = {}
+
+    def get_height(self):
+        return get_image_size(self.sprite_dict[self.image])[1]
+
+    def get_width(self):
+        return get_image_size(self.sprite_dict[self.image])[0]
+
+    def get_position(self):
+        return self.position
+
+    def get_center(self, world_size):
+        return (
+            (self.position[0] + self.get_width() / 2) % world_size[0],
+            (self.position[1] + self.get_height() / 2) % world_size[1],
+        )
+
+    def check_collision(self, object):
+        my_pos = [
+            self.position[0] + self.get_width() / 2,
+            self.position[1] + self.get_height() / 2,
+        ]
+        object_pos = object.get_position()
+        bottom = object_pos[1] + object.get_height()
+        right = object_pos[0] + object.get_width()
+        if object_pos[1] <= my_pos[1] <= bottom:
+            if object_pos[0] <= my_pos[0] <= right:
+                return True
+
+
+def bytes_per_entity(entity_class, sprite_dict):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    entities = [entity_class(sprite_dict, (i, i)) for i in range(ENTITY_COUNT)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # the list holding them is not part of an entity
+    allocated -= sys.getsizeof(entities)
+    return round(allocated / ENTITY_COUNT, 1)
+
+
+def ns_per_call(statement, entity, other):
+    namespace = {"entity": entity, "other": other, "world_size": WORLD_SIZE}
+    seconds = min(timeit.repeat(statement, globals=namespace, number=CALLS, repeat=5))
+    return round(seconds / CALLS * 1e9, 1)
+
+
+def measure(entity_class, sprite_dict):
+    entity = entity_class(sprite_dict, (100, 100))
+    other = entity_class(sprite_dict, (110, 100))
+    return {
+        "bytes_per_entity": bytes_per_entity(entity_class, sprite_dict),
+        "ns_per_call": {
+            "get_width": ns_per_call("entity.get_width()", entity, other),
+            "get_center": ns_per_call("entity.get_center(world_size)", entity, other),
+            "check_collision": ns_per_call(
+                "entity.check_collision(other)", entity, other
+            ),
+        },
+    }
+
+
+def main():
+    helper.load_asset_manifest()
+    sprite_dict = helper.create_sprite_dict("sprite_demon")
+    results = {
+        "entities": ENTITY_COUNT,
+        "dict_sprite": measure(DictEntity, sprite_dict),
+        "slotted": measure(Entity, sprite_dict),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
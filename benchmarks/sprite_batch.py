@@ -0,0 +1,69 @@
+"""Blit throughput of per-entity Entity.draw against the batched atlas renderer.
+
+Run from the project directory: python benchmarks/sprite_batch.py"""
+
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+
+import helper
+from world import World
+
+ENEMY_COUNTS = [50, 200, 1000, 4000]
+FRAMES = 100
+
+
+def per_entity(world):
+    blits = 0
+    for sprite in world.allsprites:
+        blits += len(sprite.draw(world.world, world.dims))
+    return blits
+
+
+def batched(world):
+    for coin in world.coin_list:
+        world.batch.add_entity(coin, world.dims)
+    world.batch.add_enemies(world.enemies, world.dims)
+    return len(world.batch.flush(world.world))
+
+
+def measure(world, draw):
+    blits = 0
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        blits += draw(world)
+    seconds = time.perf_counter() - start
+    return {
+        "blits_per_second": blits / seconds,
+        "ms_per_frame": seconds / FRAMES * 1000,
+    }
+
+
+def main():
+    pg.init()
+    pg.display.set_mode(helper.WIN_SIZE)
+    results = []
+    for count in ENEMY_COUNTS:
+        world = World(((512 * 3) // 2, (288 * 3)), "VIKING")
+        world.start()
+        for _ in range(count - 1):
+            world.gen_enemy()
+        results.append(
+            {
+                "enemies": count,
+                "per_entity": measure(world, per_entity),
+                "batched": measure(world, batched),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Stress and soak runs of the real game loop under the SDL dummy drivers.
+
+Every scenario resets the one Game and feeds Game.frame scripted key events,
+one simulation tick per frame as fast as the machine allows. Players are kept
+alive so matches never end early. The JSON report has ticks per second,
+frame time percentiles, samples of RSS and cache sizes over time and the
+sound plays made, merged and dropped, to track scaling limits and catch
+caches that only ever grow.
+
+Run from the project directory:
+
+    python benchmarks/stress.py --ticks 1200 --output stress.json"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame as pg
+
+import game
+import helper
+
+PERCENTILES = [50, 95, 99]
+# frames between RSS and cache samples
+SAMPLE_EVERY = 60
+IMMORTAL = 10**9
+# one Game for every scenario, SDL cannot recreate its scaled window
+GAME = None
+
+
+def rss_mb():
+    """Resident set size now, or the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def key(key_code, down=True):
+    return pg.event.Event(
+        pg.KEYDOWN if down else pg.KEYUP, key=key_code, mod=0, unicode="", scancode=0
+    )
+
+
+class Run:
+    """Drives one Game and collects frame times and memory samples"""
+
+    def __init__(self, players=2):
+        global GAME
+        if GAME is None:
+            GAME = game.Game()
+            # measure the game, not the images still loading in the background
+            GAME.loader.finish()
+        self.game = GAME
+        self.game.game_state = game.MENU
+        self.game.drawn_state = None
+        self.game.initialize_menu_background()
+        self.game.number_of_players = players
+        self.frame_times = []
+        self.samples = []
+        helper.SOUNDS.reset_stats()
+        self.ticks = 0
+        self.start = time.perf_counter()
+
+    def frame(self, events=()):
+        start = time.perf_counter()
+        self.game.frame(list(events), 1)
+        self.frame_times.append(time.perf_counter() - start)
+        if self.game.game_state in (game.GAME, game.MENU):
+            self.ticks += 1
+        if len(self.frame_times) % SAMPLE_EVERY == 1:
+            self.sample()
+
+    def sample(self):
+        self.samples.append(
+            {
+                "seconds": round(time.perf_counter() - self.start, 3),
+                "rss_mb": round(rss_mb(), 2),
+                "loaded_images": len(helper.LOADED_IMAGES),
+                "text_cache": len(helper.TEXT_CACHE.surfaces),
+                "enemies": sum(len(world.enemies) for world in self.game.players),
+            }
+        )
+
+    def start_match(self):
+        """Menu to character select to match, everyone moving and immortal"""
+        self.frame([key(pg.K_SPACE)])
+        self.frame([key(pg.K_SPACE)])
+        for world in self.game.players:
+            world.player.lives = IMMORTAL
+            world.money = IMMORTAL
+        self.frame([key(pg.K_a), key(pg.K_UP)])
+
+    def buy(self, key_code, times):
+        """Press a power key times in one frame, with player 1's shop open"""
+        if not self.game.players[0].shop.open:
+            self.frame([key(pg.K_q)])
+        self.frame([key(key_code) for _ in range(times)])
+
+    def report(self, name, **extra):
+        self.sample()
+        seconds = time.perf_counter() - self.start
+        frame_ms = np.array(self.frame_times) * 1000
+        for world in self.game.players:
+            world.close()
+        self.game.players = []
+        return dict(
+            {
+                "scenario": name,
+                "players": self.game.number_of_players,
+                "ticks": self.ticks,
+                "seconds": round(seconds, 3),
+                "ticks_per_second": round(self.ticks / seconds, 1),
+                "frame_ms": dict(
+                    zip(
+                        ["p{}".format(p) for p in PERCENTILES],
+                        np.percentile(frame_ms, PERCENTILES).round(3).tolist(),
+                    ),
+                    max=round(float(frame_ms.max()), 3),
+                ),
+                "rss_growth_mb": round(
+                    self.samples[-1]["rss_mb"] - self.samples[0]["rss_mb"], 2
+                ),
+                "samples": self.samples,
+                "sound_plays": helper.SOUNDS.stats,
+            },
+            **extra
+        )
+
+
+def players(count, ticks):
+    run = Run(players=count)
+    run.start_match()
+    for _ in range(ticks):
+        run.frame()
+    return run.report("players_{}".format(count))
+
+
+def more_ramp(ticks, stages=8, first_purchase=25):
+    """Player 1 buys ever more enemies for player 2, doubling every stage"""
+    run = Run()
+    run.start_match()
+    stage_results = []
+    purchase = first_purchase
+    for _ in range(stages):
+        run.buy(pg.K_f, purchase)
+        start, ticks_before = time.perf_counter(), run.ticks
+        for _ in range(ticks // stages):
+            run.frame()
+        stage_results.append(
+            {
+                "enemies": len(run.game.players[1].enemies),
+                "ticks_per_second": round(
+                    (run.ticks - ticks_before) / (time.perf_counter() - start), 1
+                ),
+            }
+        )
+        purchase *= 2
+    return run.report("more_ramp", stages=stage_results)
+
+
+def speed_stack(ticks, stages=8, enemies=200, purchases=5):
+    """A crowd of enemies made faster and faster"""
+    run = Run()
+    run.start_match()
+    run.buy(pg.K_f, enemies)
+    stage_results = []
+    for _ in range(stages):
+        run.buy(pg.K_g, purchases)
+        for _ in range(ticks // stages):
+            run.frame()
+        speeds = run.game.players[1].enemies.speeds[: len(run.game.players[1].enemies)]
+        stage_results.append({"mean_speed": round(float(speeds.mean()), 2)})
+    return run.report("speed_stack", stages=stage_results)
+
+
+def menu_idle(seconds):
+    """The title screen left running, flipping themes with the music"""
+    run = Run()
+    themes = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        run.frame()
+        if not themes or themes[-1] != run.game.menu_theme:
+            themes.append(run.game.menu_theme)
+    return run.report("menu_idle", theme_flips=len(themes) - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=1200)
+    parser.add_argument("--menu-seconds", type=float, default=20)
+    parser.add_argument(
+        "--scenario",
+        nargs="*",
+        default=["players", "more_ramp", "speed_stack", "menu_idle"],
+        choices=["players", "more_ramp", "speed_stack", "menu_idle"],
+    )
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    for scenario in args.scenario:
+        if scenario == "players":
+            results += [players(count, args.ticks) for count in [2, 3, 4, 6, 8]]
+        elif scenario == "more_ramp":
+            results.append(more_ramp(args.ticks))
+        elif scenario == "speed_stack":
+            results.append(speed_stack(args.ticks))
+        elif scenario == "menu_idle":
+            results.append(menu_idle(args.menu_seconds))
+
+    report = json.dumps(
+        {
+            "python": platform.python_version(),
+            "pygame": pg.version.ver,
+            "platform": platform.platform(),
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import numpy as np
+
+COIN_PICKUP = "coin"
+ENEMY_HIT = "hit"
+PIT_FALL = "pit"
+
+
+class CollisionSystem:
+    """Axis-aligned boxes for a world's coins, enemies and pit.
+
+    check() runs one batched overlap test per kind each tick and returns the
+    events for World.player_update to apply. Like Entity.check_collision, a
+    hit is the center of one object falling inside another's box. Boxes wrap
+    around the world torus like the sprites drawn for them."""
+
+    def __init__(self, pit, world_size):
+        self.pit = pit
+        self.world_size = np.asarray(world_size, dtype=float)
+
+    def check(self, player, coins, enemies):
+        """Pickup, hit and pit events for this tick as (event, entity) pairs.
+
+        enemies is the world's EnemyStore. An enemy that hits the player is not
+        also reported as falling in the pit."""
+        player_center = box_center(entity_box(player))
+        events = []
+
+        if coins:
+            coin_boxes = np.array([entity_box(coin) for coin in coins])
+            for i in np.flatnonzero(
+                contains(coin_boxes, player_center, self.world_size)
+            ):
+                events.append((COIN_PICKUP, coins[i]))
+
+        n = len(enemies)
+        if n:
+            enemy_boxes = np.empty((n, 4))
+            enemy_boxes[:, :2] = enemies.positions[:n]
+            enemy_boxes[:, 2:] = enemies.positions[:n] + enemies.current_sizes()
+            hits = contains(enemy_boxes, player_center, self.world_size)
+            pit_center = box_center(entity_box(self.pit))
+            falls = contains(enemy_boxes, pit_center, self.world_size) & ~hits
+            for i in np.flatnonzero(hits | falls):
+                events.append((ENEMY_HIT if hits[i] else PIT_FALL, enemies.enemies[i]))
+        return events
+
+
+def entity_box(entity):
+    """(left, top, right, bottom) of an entity at its current position"""
+    x, y = entity.position
+    return (x, y, x + entity.get_width(), y + entity.get_height())
+
+
+def box_center(box):
+    return ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+
+
+def contains(boxes, point, world_size):
+    """Which of the (n, 4) boxes contain point on the torus, edges included.
+
+    The point is measured from each box's top left corner, wrapped into the
+    world like SpatialGrid.delta, so a box hanging over an edge contains the
+    points it covers on the other side."""
+    offset = (np.asarray(point, dtype=float) - boxes[:, :2]) % world_size
+    return (offset[:, 0] <= boxes[:, 2] - boxes[:, 0]) & (
+        offset[:, 1] <= boxes[:, 3] - boxes[:, 1]
+    )
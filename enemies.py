@@ -0,0 +1,325 @@
+import math
+
+import numpy as np
+
+from entity import BaseEntity
+from helper import LOADED_IMAGES, get_image_size
+
+AI_KINDS = {"follow": 0, "distance": 1, "amble": 2, "madman": 3}
+FOLLOW, DISTANCE, AMBLE, MADMAN = range(4)
+FACINGS = ["LEFT", "RIGHT", "UP", "DOWN", "DEAD"]
+FACING_CODES = {facing: code for code, facing in enumerate(FACINGS)}
+LEFT, RIGHT, UP, DOWN, DEAD = range(5)
+
+
+class EnemyStore:
+    """Struct-of-arrays state for every enemy in a world, stepped as one batch.
+
+    Enemy objects are thin views onto a row of these arrays, so rendering and
+    the rest of World keep using the Entity interface."""
+
+    def __init__(self, capacity=64, rng=None):
+        self.count = 0
+        self.enemies = []
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.positions = np.zeros((capacity, 2))
+        self.speeds = np.zeros(capacity)
+        # width and height of the sprite for every facing, so size follows set_dir
+        self.sizes = np.zeros((capacity, len(FACINGS), 2))
+        self.facing = np.full(capacity, DOWN, dtype=np.int8)
+        self.ai = np.zeros(capacity, dtype=np.int8)
+        # index into sprite_dicts, the distinct sprite dicts in use
+        self.sprite_dict_ids = np.zeros(capacity, dtype=np.int16)
+        self.sprite_dicts = []
+
+        self.amble_vec = np.zeros((capacity, 2))
+        self.amble_idle = np.zeros(capacity, dtype=np.int32)
+        self.mad_vec = np.zeros((capacity, 2))
+        self.mad_timer = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def capacity(self):
+        return len(self.speeds)
+
+    def grow(self):
+        capacity = self.capacity() * 2
+        for name in [
+            "positions",
+            "speeds",
+            "sizes",
+            "facing",
+            "ai",
+            "sprite_dict_ids",
+            "amble_vec",
+            "amble_idle",
+            "mad_vec",
+            "mad_timer",
+        ]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def add(self, enemy):
+        """Reserve a row for enemy and return its index"""
+        if self.count == self.capacity():
+            self.grow()
+        index = self.count
+        self.positions[index] = 0
+        self.facing[index] = DOWN
+        self.count += 1
+        self.enemies.append(enemy)
+        return index
+
+    def clear(self):
+        self.count = 0
+        self.enemies = []
+
+    def set_sprite_dict(self, index, sprite_dict):
+        for code, facing in enumerate(FACINGS):
+            if facing in sprite_dict:
+                self.sizes[index, code] = get_image_size(sprite_dict[facing])
+        if sprite_dict not in self.sprite_dicts:
+            self.sprite_dicts.append(sprite_dict)
+        self.sprite_dict_ids[index] = self.sprite_dicts.index(sprite_dict)
+
+    def sprite_names(self, indices):
+        """Current sprite name of each indexed enemy"""
+        table = np.empty((len(self.sprite_dicts), len(FACINGS)), dtype=object)
+        for row, sprite_dict in enumerate(self.sprite_dicts):
+            table[row] = [sprite_dict.get(facing) for facing in FACINGS]
+        return table[self.sprite_dict_ids[indices], self.facing[indices]]
+
+    def draw_positions(self, world_size):
+        """Enemy index and position of every blit Entity.draw would make, in order"""
+        n = self.count
+        self.wrap(world_size)
+        pos = self.positions[:n]
+        size = self.current_sizes()
+        wrap_x = pos[:, 0] + size[:, 0] > world_size[0]
+        wrap_y = pos[:, 1] + size[:, 1] > world_size[1]
+        x, y = pos[:, 0], pos[:, 1]
+        wrapped_x = x - world_size[0]
+        wrapped_y = y - world_size[1]
+        candidates = np.stack(
+            [
+                np.stack([wrapped_x, y], axis=1),
+                np.stack([x, wrapped_y], axis=1),
+                np.stack([wrapped_x, wrapped_y], axis=1),
+                pos,
+            ],
+            axis=1,
+        )
+        valid = np.stack(
+            [wrap_x, wrap_y, wrap_x & wrap_y, np.ones(n, dtype=bool)], axis=1
+        )
+        indices = np.broadcast_to(np.arange(n)[:, None], (n, 4))[valid]
+        return indices, candidates[valid]
+
+    def set_ai(self, index, ai):
+        if ai not in AI_KINDS:
+            raise ValueError("No such ai method {}".format(ai))
+        self.ai[index] = AI_KINDS[ai]
+        if ai == "amble":
+            self.amble_vec[index] = self.rng.random(2)
+            self.amble_idle[index] = self.rng.integers(60, 241)
+        elif ai == "madman":
+            self.speeds[index] = 20
+            self.mad_vec[index] = self.rng.uniform(-1, 1, 2)
+            self.mad_timer[index] = 5
+
+    def uses_ai(self, ai):
+        return bool((self.ai[: self.count] == AI_KINDS[ai]).any())
+
+    def current_sizes(self):
+        n = self.count
+        return self.sizes[np.arange(n), self.facing[:n]]
+
+    def centers(self, world_size):
+        return (self.positions[: self.count] + self.current_sizes() / 2) % world_size
+
+    def add_speed(self, amount):
+        self.speeds[: self.count] += amount
+
+    def slide(self, vec):
+        self.positions[: self.count] += vec
+
+    def wrap(self, world_size):
+        self.positions[: self.count] %= world_size
+
+    def step(self, world_size, target_center, grid=None):
+        """Move every enemy one frame towards, away from or around target_center.
+
+        grid is a SpatialGrid rebuilt over these enemies' centers this tick, used
+        for the nearest neighbour lookups of the distance ai."""
+        n = self.count
+        if n == 0:
+            return
+        world_size = np.asarray(world_size, dtype=float)
+        target = np.asarray(target_center, dtype=float)
+        centers = self.centers(world_size)
+        ai = self.ai[:n]
+        direction = np.zeros((n, 2))
+
+        follow = ai == FOLLOW
+        direction[follow] = target - centers[follow]
+
+        distance = ai == DISTANCE
+        if distance.any():
+            direction[distance] = self.distance_directions(
+                centers, distance, target, grid
+            )
+
+        amble = ai == AMBLE
+        if amble.any():
+            direction[amble] = self.amble_directions(amble)
+
+        madman = ai == MADMAN
+        if madman.any():
+            direction[madman] = self.madman_directions(madman)
+
+        norm = np.hypot(direction[:, 0], direction[:, 1])
+        moving = norm > 0
+        unit = direction[moving] / norm[moving, None]
+        self.positions[:n][moving] += unit * self.speeds[:n][moving, None]
+        self.facing[:n][moving] = facing_codes(-unit, self.facing[:n][moving])
+
+    def distance_directions(self, centers, mask, target, grid=None):
+        """Run at the target when it is close, otherwise away from the nearest enemy"""
+        me = centers[mask]
+        if grid is not None:
+            nearest, min_dist = grid.nearest(np.flatnonzero(mask))
+            away = -grid.delta(me, grid.points[np.maximum(nearest, 0)])
+        else:
+            deltas = me[:, None, :] - centers[None, :, :]
+            dists = np.hypot(deltas[..., 0], deltas[..., 1])
+            dists[np.arange(len(me)), np.flatnonzero(mask)] = math.inf
+            nearest = dists.argmin(axis=1)
+            min_dist = dists[np.arange(len(me)), nearest]
+            away = me - centers[nearest]
+
+        to_target = target - me
+        target_dist = np.hypot(to_target[:, 0], to_target[:, 1])
+        chase = (target_dist < min_dist) | (target_dist < 100)
+        return np.where(chase[:, None], to_target, away)
+
+    def amble_directions(self, mask):
+        idle = mask & (self.amble_idle[: self.count] > 0)
+        self.amble_idle[: self.count][idle] -= 1
+
+        active = mask & ~idle
+        reroll = active & (self.rng.random(self.count) > 0.99)
+        rerolled = np.count_nonzero(reroll)
+        self.amble_idle[: self.count][reroll] = self.rng.integers(60, 241, rerolled)
+        self.amble_vec[: self.count][reroll] = self.rng.uniform(-1, 1, (rerolled, 2))
+
+        walking = active & ~reroll
+        return np.where(walking[:, None], self.amble_vec[: self.count], 0)[mask]
+
+    def madman_directions(self, mask):
+        timer = self.mad_timer[: self.count]
+        vec = self.mad_vec[: self.count]
+        turn = mask & (timer <= 0)
+        if turn.any():
+            timer[turn] = 5
+            angle = np.radians(self.rng.uniform(-15, 15, np.count_nonzero(turn)))
+            x, y = vec[turn, 0], vec[turn, 1]
+            vec[turn] = np.stack(
+                [
+                    x * np.cos(angle) - y * np.sin(angle),
+                    x * np.sin(angle) + y * np.cos(angle),
+                ],
+                axis=1,
+            )
+        timer[mask] -= 1
+        return vec[mask]
+
+
+def facing_codes(vectors, current):
+    """Vectorised Entity.set_dir; later assignments take priority like its elifs"""
+    codes = current.copy()
+    codes[vectors[:, 1] < 0] = DOWN
+    codes[vectors[:, 1] > 0] = UP
+    codes[vectors[:, 0] < -0.5] = RIGHT
+    codes[vectors[:, 0] > 0.5] = LEFT
+    return codes
+
+
+class Enemy(BaseEntity):
+    """Entity whose position, speed, facing and ai live in an EnemyStore row.
+
+    Only what the store does not hold gets a slot of its own."""
+
+    __slots__ = ("store", "index", "_sprite_dict", "_ai")
+
+    def __init__(self, store, sprite_dict, position, lives=3, speed=1, ai="follow"):
+        self.store = store
+        self.index = store.add(self)
+        self.sprite_dict = sprite_dict
+        self.set_position(position)
+        self.lives = lives
+        self.max_lives = lives
+        self.speed = speed
+        self.ai = ai
+
+    @property
+    def position(self):
+        return self.store.positions[self.index]
+
+    @position.setter
+    def position(self, position):
+        self.store.positions[self.index] = position
+
+    @property
+    def speed(self):
+        return float(self.store.speeds[self.index])
+
+    @speed.setter
+    def speed(self, speed):
+        self.store.speeds[self.index] = speed
+
+    @property
+    def image(self):
+        return FACINGS[self.store.facing[self.index]]
+
+    @image.setter
+    def image(self, image):
+        self.store.facing[self.index] = FACING_CODES[image]
+
+    @property
+    def sprite_dict(self):
+        return self._sprite_dict
+
+    @sprite_dict.setter
+    def sprite_dict(self, sprite_dict):
+        self._sprite_dict = sprite_dict
+        self.store.set_sprite_dict(self.index, sprite_dict)
+
+    @property
+    def ai(self):
+        return self._ai
+
+    @ai.setter
+    def ai(self, ai):
+        self._ai = ai
+        self.store.set_ai(self.index, ai)
+
+    @property
+    def sprite_id(self):
+        return self._sprite_dict[self.image]
+
+    @property
+    def size(self):
+        return self.store.sizes[self.index, self.store.facing[self.index]]
+
+    def get_sprite(self):
+        return LOADED_IMAGES[self.sprite_id]
+
+    def get_width(self):
+        return self.store.sizes[self.index, self.store.facing[self.index], 0]
+
+    def get_height(self):
+        return self.store.sizes[self.index, self.store.facing[self.index], 1]
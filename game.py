@@ -1,34 +1,42 @@
-import os
-import math
 import time
 
+# the startup timeline counts importing pygame and the game's modules
+IMPORT_START = time.perf_counter()
+
+import argparse
+import math
+import random
+
 import pygame as pg
 
 # from pygame.compat import geterror
 from pygame.locals import *
 
+import assetpack
 import helper
+import replay
+import workers
 from helper import (
-    load_sound,
-    load_music,
-    DATA_DIR,
-    load_all_images,
+    render_text,
+    SOUNDS,
     WIN_SIZE,
     LOADED_IMAGES,
 )
+from input_router import InputRouter
+from layout import MAX_PLAYERS, Layout, RenderBudget
+from loader import AssetLoader
 from world import World
 from entity import Entity
-
-if not pg.font:
-    print("Warning, fonts disabled")
-if not pg.mixer:
-    print("Warning, sound disabled")
+from profiler import PROFILER, Timeline
+from timestep import FixedTimestep
 
 MENU = 1
 GAME = 2
 END = 3
 SELECT = 4
 GAME_STATE = MENU
+# frames are drawn as fast as vsync allows, up to this cap when it is unavailable
+MAX_FPS = 240
 
 WHITE = (255, 255, 255)
 GREY = (122, 122, 122)
@@ -36,73 +44,133 @@ GREEN = (20, 239, 20)
 BLACK = (0, 0, 0)
 
 GAME_NAME = "Freyr's Wrath"
-XBOX360 = {"A": 0, "B": 1, "X": 2, "Y": 3, "LB": 4, "RB": 5}
-P1DIRS = {
-    pg.K_w: "UP",
-    pg.K_s: "DOWN",
-    pg.K_a: "LEFT",
-    pg.K_d: "RIGHT",
-    pg.K_f: "MORE",
-    pg.K_g: "SPEED",
-    pg.K_h: "HEAL",
-}
-P2DIRS = {
-    pg.K_UP: "UP",
-    pg.K_DOWN: "DOWN",
-    pg.K_LEFT: "LEFT",
-    pg.K_RIGHT: "RIGHT",
-    pg.K_k: "MORE",
-    pg.K_l: "SPEED",
-    pg.K_SEMICOLON: "HEAL",
-}
-pg.init()
-joysticks = [pg.joystick.Joystick(x) for x in range(pg.joystick.get_count())]
+STARTUP = Timeline(IMPORT_START)
+STARTUP.mark("import")
 
 # TODO
-# Store sounds and fonts in dictionary created by helper.py
 # Draw PIT on title background
 # Cut off empty end end of fishing.wav or make it a full bar if it breaks looping of title screen background in sync with music
 
 
 class Game:
-    def __init__(self, state=MENU):
+    def __init__(
+        self,
+        state=MENU,
+        use_workers=False,
+        seed=None,
+        record_path=None,
+        scaled=True,
+    ):
         self.game_state = state
+        # pg.SCALED fits the window to the screen but presents whole frames
+        self.scaled = scaled
+        # simulate each world in its own process, see workers.py
+        self.use_workers = use_workers
+        # seeds every world's random streams, see World and replay.py
+        self.random = random.Random(seed)
+        self.record_path = record_path
+        self.recorder = None
         self.background_surface = None  # init in setup_game
         self.screen = None  # init in setup_game
-        self.button_sound = None
-        self.victory_sound = None
-        self.select_sound = None
         self.number_of_players = 2
         self.themes = ["VIKING", "PRIEST", "FARMER", "DEMON"]
         self.menu_theme = 0  # Set to viking for scrolling_menu_background
+        # a new menu background every run, reused as the themes cycle
+        self.menu_seed = random.randrange(2**32)
         self.players = []
+        # where each world is drawn on the screen, see initialize_game_worlds
+        self.layout = None
+        self.budget = None
+        # screen rects to push this frame, None for a full flip
+        self.update_rects = None
+        self.drawn_state = None
+        # decodes the images the menu does not need yet, see setup_game
+        self.loader = None
+        self.input = InputRouter(
+            self, {MENU: "menu", SELECT: "select", GAME: "game", END: "end"}
+        )
         self.setup_game()
 
     def create_scrolling_menu_background(self):
-        bg = helper.create_background(self.themes[self.menu_theme], helper.WIN_SIZE)
+        bg = helper.create_background(
+            self.themes[self.menu_theme], helper.WIN_SIZE, self.menu_seed
+        )
         return Entity(bg, (0, 0))
 
     def setup_game(self):
-        self.screen = pg.display.set_mode(WIN_SIZE, pg.SCALED | pg.RESIZABLE)
-        load_all_images()
-        pg.display.set_icon(LOADED_IMAGES["sprite_viking_front"])
+        """Start the pygame subsystems the game uses, not all of pg.init(),
+        and everything the menu needs, marking each step in STARTUP"""
+        pg.display.init()
+        pg.font.init()
+        if self.scaled:
+            self.screen = pg.display.set_mode(
+                WIN_SIZE, pg.SCALED | pg.RESIZABLE, vsync=1
+            )
+        else:
+            self.screen = pg.display.set_mode(WIN_SIZE)
+        self.input.allow_events()
         pg.display.set_caption(GAME_NAME)
+        STARTUP.mark("display")
+        LOADED_IMAGES.pack = assetpack.open_pack()
+        # the menu cycles through every theme's tiles, the first one at once
+        menu_images = ["sprite_viking_front"] + helper.theme_images(
+            self.themes[self.menu_theme]
+        )
+        later_themes = (
+            self.themes[self.menu_theme + 1 :] + self.themes[: self.menu_theme]
+        )
+        self.loader = AssetLoader(
+            menu_images
+            + [name for theme in later_themes for name in helper.theme_images(theme)]
+            + list(LOADED_IMAGES.paths)
+        )
+        self.show_loading_screen(menu_images)
+        pg.display.set_icon(LOADED_IMAGES["sprite_viking_front"])
         self.scrolling_menu_background = self.create_scrolling_menu_background()
         self.initialize_menu_background()
+        STARTUP.mark("assets")
 
-        self.button_sound = load_sound("button_sound.wav")
-        self.button_sound.set_volume(0.5)
+        try:
+            pg.mixer.init()
+        except pg.error:
+            print("Warning, sound disabled")
+        SOUNDS.load("button_sound.wav", 0.5)
+        SOUNDS.load("victory.wav", 0.3)
+        SOUNDS.load("select_sound.wav", 0.3)
 
-        self.victory_sound = load_sound("victory.wav")
-        self.victory_sound.set_volume(0.3)
+        SOUNDS.play_music("Fishing_Song.wav", 0.2)
+        STARTUP.mark("audio")
 
-        self.select_sound = load_sound("select_sound.wav")
-        self.select_sound.set_volume(0.3)
+        # controllers already plugged in arrive as JOYDEVICEADDED events
+        pg.joystick.init()
+        STARTUP.mark("joysticks")
 
-        load_music("Fishing_Song.wav")
-        # pg.mixer.music.load(load_music("Fishing_Song.wav"))
-        pg.mixer.music.set_volume(0.2)
-        pg.mixer.music.play(-1)
+    def show_loading_screen(self, names):
+        """Draw a progress bar until the named images are loaded"""
+        clock = pg.time.Clock()
+        while not self.loader.ready(names):
+            # keeps the window responsive; the events wait for the menu
+            pg.event.pump()
+            self.loader.poll()
+            self.draw_loading_screen(self.loader.progress(names))
+            pg.display.flip()
+            clock.tick(60)
+
+    def draw_loading_screen(self, progress):
+        self.screen.fill(BLACK)
+        text_loading = render_text("Amatic-Bold.ttf", 20 * 3, "Loading", (220, 20, 60))
+        self.screen.blit(
+            text_loading,
+            text_loading.get_rect(
+                centerx=self.screen.get_width() / 2,
+                centery=self.screen.get_height() / 2.2,
+            ),
+        )
+        bar = pg.Rect(0, 0, self.screen.get_width() / 3, 12)
+        bar.center = (self.screen.get_width() / 2, self.screen.get_height() / 1.8)
+        pg.draw.rect(self.screen, (220, 20, 60), bar, 1)
+        bar.width = int(bar.width * progress)
+        pg.draw.rect(self.screen, (220, 20, 60), bar)
 
     def initialize_menu_background(self):
         # Create The Menu
@@ -115,8 +183,7 @@ class Game:
         self.write_menu_text()
 
     def write_menu_text(self):
-        font_title = pg.font.Font(os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 36 * 3)
-        text_title = font_title.render(GAME_NAME, 1, (220, 20, 60))
+        text_title = render_text("Amatic-Bold.ttf", 36 * 3, GAME_NAME, (220, 20, 60))
         text_title = pg.transform.rotate(text_title, math.sin(time.time() / 1.5) * 10)
         text_title = pg.transform.scale(
             text_title,
@@ -132,8 +199,9 @@ class Game:
 
         self.background_surface.blit(text_title, textpos_title)
 
-        font_team = pg.font.Font(os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 12 * 3)
-        text_team = font_team.render("Team Fishing Minigame Metaphor", 1, (220, 20, 60))
+        text_team = render_text(
+            "Amatic-Bold.ttf", 12 * 3, "Team Fishing Minigame Metaphor", (220, 20, 60)
+        )
         textpos_team = text_team.get_rect(
             centerx=self.background_surface.get_width() / 2,
             centery=self.background_surface.get_height() / 1.8,
@@ -142,18 +210,15 @@ class Game:
 
         self.draw_number_players_selector()
 
-        text_by = font_team.render("by", 1, (220, 20, 60))
+        text_by = render_text("Amatic-Bold.ttf", 12 * 3, "by", (220, 20, 60))
         textpos_by = text_by.get_rect(
             centerx=self.background_surface.get_width() / 2,
             centery=self.background_surface.get_height() / 2.2,
         )
         self.background_surface.blit(text_by, textpos_by)
 
-        font_space_to_begin = pg.font.Font(
-            os.path.join(DATA_DIR, "AmaticSC-Regular.ttf"), 16 * 3
-        )
-        text_space_to_begin = font_space_to_begin.render(
-            "Press Spacebar to Start", 1, (220, 20, 60)
+        text_space_to_begin = render_text(
+            "AmaticSC-Regular.ttf", 16 * 3, "Press Spacebar to Start", (220, 20, 60)
         )
         textpos_space_to_begin = text_space_to_begin.get_rect(
             centerx=self.background_surface.get_width() / 2,
@@ -162,23 +227,19 @@ class Game:
         self.background_surface.blit(text_space_to_begin, textpos_space_to_begin)
 
     def draw_number_players_selector(self):
-        font_number_of_players = pg.font.Font(
-            os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 20 * 3
-        )
-
         number_players_string = "  Number of players:  "
         if self.number_of_players > 2:
             number_players_string += "< "
         else:
             number_players_string += "   "
         number_players_string += str(self.number_of_players)
-        if self.number_of_players < 4:
+        if self.number_of_players < MAX_PLAYERS:
             number_players_string += " >"
         else:
             number_players_string += "    "
 
-        text_number_of_players = font_number_of_players.render(
-            number_players_string, 1, (220, 20, 60)
+        text_number_of_players = render_text(
+            "Amatic-Bold.ttf", 20 * 3, number_players_string, (220, 20, 60)
         )
         textpos_number_of_players = text_number_of_players.get_rect(
             centerx=self.background_surface.get_width() / 2,
@@ -190,55 +251,39 @@ class Game:
         self.initialize_menu_background()
         self.draw_number_players_selector()
 
-    def draw_game_background(self):
-        screen_height = self.screen.get_size()[1]
-        screen_width = self.screen.get_size()[0]
-        half_screen_width = (screen_width / 2) + 1
-        half_screen_height = (screen_height / 2) + 1
-
-        self.screen.fill(BLACK)
-
-        if len(self.players) == 2:
-            self.screen.blit(self.players[0].world, (0, 1))
-            self.screen.blit(self.players[1].world, (half_screen_width, 1))
-        elif len(self.players) == 3:
-            self.screen.blit(self.players[0].world, (0, 0))
-            self.screen.blit(self.players[1].world, (half_screen_width, 0))
-            self.screen.blit(
-                self.players[2].world, (screen_width / 4, half_screen_height)
-            )
-        elif len(self.players) == 4:
-            self.screen.blit(self.players[0].world, (0, 0))
-            self.screen.blit(self.players[1].world, (half_screen_width, 0))
-            self.screen.blit(self.players[2].world, (0, half_screen_height))
-            self.screen.blit(
-                self.players[3].world, (half_screen_width, half_screen_height)
-            )
+    def draw_game_background(self, drawn):
+        """Collect the screen rects the drawn worlds changed this frame.
+
+        Worlds draw straight onto their viewports of the screen. On the first
+        game frame the gutters are cleared and the whole screen flipped; after
+        that update_rects lists what pg.display.update must push. Under
+        pg.SCALED the renderer presents the whole frame whatever rects it is
+        given, so there it stays None and every frame is flipped."""
+        if self.drawn_state != GAME:
+            self.layout.clear_gutters(self.screen)
+        if self.drawn_state != GAME or self.scaled:
+            self.update_rects = None
+            return
+
+        self.update_rects = []
+        for player in drawn:
+            viewport = self.layout.viewports[player.index]
+            if player.dirty_rects is None:
+                self.update_rects.append(viewport)
+            else:
+                self.update_rects += [
+                    rect.move(viewport.topleft) for rect in player.dirty_rects
+                ]
 
     def draw_select_background(self):
-        screen_height = self.screen.get_size()[1]
-        screen_width = self.screen.get_size()[0]
-        half_screen_width = (screen_width / 2) + 1
-        half_screen_height = (screen_height / 2) + 1
-
-        self.screen.fill(BLACK)
+        self.layout.clear_gutters(self.screen)
 
-        if len(self.players) == 2:
-            self.screen.blit(self.players[0].world, (0, 1))
-            self.screen.blit(self.players[1].world, (half_screen_width, 1))
-        elif len(self.players) == 3:
-            self.screen.blit(self.players[0].world, (0, 0))
-            self.screen.blit(self.players[1].world, (half_screen_width, 0))
-            self.screen.blit(
-                self.players[2].world, (screen_width / 4, half_screen_height)
-            )
-        elif len(self.players) == 4:
-            self.screen.blit(self.players[0].world, (0, 0))
-            self.screen.blit(self.players[1].world, (half_screen_width, 0))
-            self.screen.blit(self.players[2].world, (0, half_screen_height))
-            self.screen.blit(
-                self.players[3].world, (half_screen_width, half_screen_height)
-            )
+    def redraw_worlds(self, state):
+        """Have every world repaint its whole viewport when the screen was last
+        drawn for something other than state, like the menu or the profiler"""
+        if self.drawn_state != state:
+            for player in self.players:
+                player.full_redraw = True
 
     def draw_end_background(self):
         self.background_surface = pg.Surface(self.screen.get_size())
@@ -255,16 +300,18 @@ class Game:
 
     def write_end_text(self, winner, sprite_name):
 
-        font_title = pg.font.Font(os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 36 * 3)
-        text_title = font_title.render(winner + " wins!", 1, (255, 20, 30))
+        text_title = render_text(
+            "Amatic-Bold.ttf", 36 * 3, winner + " wins!", (255, 20, 30)
+        )
         textpos_title = text_title.get_rect(
             centerx=self.background_surface.get_width() / 2,
             centery=self.background_surface.get_height() / 5,
         )
         self.background_surface.blit(text_title, textpos_title)
 
-        font_team = pg.font.Font(os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 12 * 3)
-        text_team = font_team.render("Team Fishing Minigame Metaphor", 1, (220, 20, 60))
+        text_team = render_text(
+            "Amatic-Bold.ttf", 12 * 3, "Team Fishing Minigame Metaphor", (220, 20, 60)
+        )
         textpos_team = text_team.get_rect(
             centerx=self.background_surface.get_width() / 2,
             centery=self.background_surface.get_height() / 1.8,
@@ -280,7 +327,7 @@ class Game:
 
         self.background_surface.blit(winner_sprite, winner_sprite_pos)
 
-    def main(self):
+    def main(self, print_startup=False):
         """this function is called when the program starts.
         it initializes everything it needs, then runs in
         a loop until the function returns."""
@@ -288,296 +335,166 @@ class Game:
 
         # Prepare Game Objects
         clock = pg.time.Clock()
-        allsprites = pg.sprite.RenderPlain(())
+        timestep = FixedTimestep()
         # Main Loop
         going = True
+        first_frame = True
         while going:
-            clock.tick(60)
+            clock.tick(MAX_FPS)
             # Handle Input Events
 
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    going = False
-                elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                    going = False
-                elif event.type == pg.KEYDOWN and event.key == pg.K_v:
-                    pg.display.toggle_fullscreen()
-                elif event.type == pg.VIDEORESIZE:
-                    pg.display._resize_event(event)
-                elif event.type == pg.KEYDOWN and event.key == pg.K_m:
-                    if not pg.mixer.music.get_busy():
-                        pg.mixer.music.unpause()
-                    else:
-                        pg.mixer.music.pause()
+            with PROFILER.phase("events"):
+                events = pg.event.get()
+            ticks = timestep.advance(time.perf_counter())
+            going = self.frame(events, ticks, timestep.alpha())
+            if first_frame:
+                first_frame = False
+                STARTUP.mark("first frame")
+                if print_startup:
+                    print(STARTUP.report())
+
+        self.stop_recording()
+        for player in self.players:
+            player.close()
+        self.loader.close()
+        pg.quit()
 
-                self.process_event(event)
+    def frame(self, events, ticks, alpha=1.0):
+        """Handle events, run ticks simulation steps and draw one frame.
 
-            if self.game_state == MENU:
-                self.menu_loop()
-            elif self.game_state == SELECT:
-                self.select_loop()
-            elif self.game_state == GAME:
-                pass
-                self.game_loop()
-            elif self.game_state == END:
-                self.end_loop()
+        Returns False once the player asked to quit."""
+        going = True
+        for event in events:
+            if event.type == pg.QUIT:
+                going = False
+            elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                going = False
+            elif event.type == pg.KEYDOWN and event.key == pg.K_v:
+                pg.display.toggle_fullscreen()
+                self.drawn_state = None
+            elif event.type == pg.VIDEORESIZE:
+                pg.display._resize_event(event)
+                self.drawn_state = None
+            elif event.type == pg.KEYDOWN and event.key == pg.K_m:
+                SOUNDS.toggle_music()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                PROFILER.toggle()
+                self.drawn_state = None
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                self.export_profile()
+
+            with PROFILER.phase("process_event"):
+                self.process_event(event)
+        self.input.flush()
 
-            allsprites.update()
+        with PROFILER.phase("assets"):
+            self.loader.poll()
 
-            # Draw Everything
-            allsprites.draw(self.screen)
-            pg.display.flip()
+        with PROFILER.phase("simulate"):
+            for _ in range(ticks):
+                self.tick()
 
-        pg.quit()
-
-    def process_event(self, event):
         if self.game_state == MENU:
-            self.process_menu_event(event)
+            self.menu_loop()
         elif self.game_state == SELECT:
-            self.process_select_event(event)
+            self.select_loop()
         elif self.game_state == GAME:
-            self.process_game_event(event)
+            self.game_loop(alpha)
         elif self.game_state == END:
-            self.process_end_event(event)
+            self.end_loop()
+
+        # Draw Everything
+        if PROFILER.enabled:
+            overlay_rect = PROFILER.draw_overlay(self.screen)
+            if self.update_rects is not None:
+                self.update_rects.append(overlay_rect)
+        with PROFILER.phase("flip"):
+            if self.game_state == GAME and self.update_rects is not None:
+                pg.display.update(self.update_rects)
+            else:
+                pg.display.flip()
+        self.drawn_state = self.game_state
+        return going
 
-    def process_menu_event(self, event):
-        if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-            self.initialize_game_worlds()
-            for player in self.players:
-                player.start()
-            self.game_state = SELECT
-            self.button_sound.play()
-        elif event.type == pg.JOYBUTTONDOWN and event.button == 0:
-            self.initialize_game_worlds()
-            for player in self.players:
-                player.start()
-            self.game_state = SELECT
-            self.button_sound.play()
-
-        elif event.type == pg.KEYDOWN and (
-            event.key == pg.K_a or event.key == pg.K_LEFT
-        ):
-            if self.number_of_players > 2:
-                self.number_of_players -= 1
-                self.select_sound.play()
-
-        elif event.type == pg.KEYDOWN and event.key in [pg.K_d, pg.K_RIGHT]:
-            if self.number_of_players < 4:
-                self.number_of_players += 1
-                self.select_sound.play()
-
-        elif event.type == JOYBUTTONDOWN and event.button == 4:
-            if self.number_of_players > 2:
-                self.number_of_players -= 1
-                self.select_sound.play()
-
-        elif event.type == JOYBUTTONDOWN and event.button == 5:
-            if self.number_of_players < 4:
-                self.number_of_players += 1
-                self.select_sound.play()
-
-    def process_select_event(self, event):
-
-        if (
-            event.type == pg.KEYDOWN
-            and event.key == pg.K_SPACE
-            and self.game_state == SELECT
-        ):
-            self.game_state = GAME
-            self.button_sound.play()
-        elif (
-            event.type == pg.JOYBUTTONDOWN
-            and event.button == 0
-            and self.game_state == SELECT
-        ):
-            self.game_state = GAME
-            self.button_sound.play()
-
-        if (
-            event.type == pg.KEYDOWN
-            and event.key == pg.K_a
-            and not self.players[0].ready
-        ):
-            self.players[0].init_character(
-                self.themes[(self.themes.index(self.players[0].get_theme()) - 1) % 4]
-            )
-            self.select_sound.play()
-        elif (
-            event.type == pg.KEYDOWN
-            and event.key == pg.K_d
-            and not self.players[0].ready
-        ):
-            self.players[0].init_character(
-                self.themes[(self.themes.index(self.players[0].get_theme()) + 1) % 4]
-            )
-            self.select_sound.play()
-        elif event.type == pg.KEYDOWN and event.key == pg.K_LEFT:
-            self.players[1].init_character(
-                self.themes[(self.themes.index(self.players[1].get_theme()) - 1) % 4]
-            )
-            self.select_sound.play()
-        elif event.type == pg.KEYDOWN and event.key == pg.K_RIGHT:
-            self.players[1].init_character(
-                self.themes[(self.themes.index(self.players[1].get_theme()) + 1) % 4]
-            )
-            self.select_sound.play()
-
-        if event.type == pg.KEYDOWN and event.key == pg.K_q:
-            self.players[0].ready = not self.players[0].ready
-            self.button_sound.play()
-
-        for index, player in enumerate(self.players):
-            try:
-                if (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["LB"]
-                ):
-                    player.init_character(
-                        self.themes[(self.themes.index(player.get_theme()) - 1) % 4]
-                    )
-            except IndexError:
-                pass
-            try:
-                if (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["RB"]
-                ):
-                    player.init_character(
-                        self.themes[(self.themes.index(player.get_theme()) + 1) % 4]
-                    )
-            except IndexError:
-                pass
-
-    def process_game_event(self, event):
-        if event.type == pg.KEYDOWN and event.key in P1DIRS:
-            self.players[0].set_dir(P1DIRS[event.key], 1)
-        elif event.type == pg.KEYUP and event.key in P1DIRS:
-            self.players[0].set_dir(P1DIRS[event.key], 0)
-
-        # controller support for player 1
-        for index, player in enumerate(self.players):
-            try:
-                if (
-                    event.type == pg.JOYHATMOTION
-                    and joysticks[index].get_instance_id() == event.instance_id
-                ):
-                    player.set_dir(0, event.value)
-            except IndexError:
-                pass
-            try:
-                if (
-                    event.type == pg.JOYAXISMOTION
-                    and joysticks[index].get_instance_id() == event.instance_id
-                ):
-                    if abs(event.value) > 0.3:
-                        player.set_dir(event.axis, event.value)
-                    else:
-                        player.set_dir(event.axis, 0.0)
-            except IndexError:
-                pass
-
-        if event.type == pg.KEYDOWN and event.key in P2DIRS:
-            self.players[1].set_dir(P2DIRS[event.key], 1)
-        elif event.type == pg.KEYUP and event.key in P2DIRS:
-            self.players[1].set_dir(P2DIRS[event.key], 0)
-
-        # shop open/close keys
-        if event.type == pg.KEYDOWN and event.key == pg.K_q:
-            self.players[0].shop.toggle_open()
-        elif event.type == pg.KEYDOWN and event.key == pg.K_p:
-            self.players[1].shop.toggle_open()
-
-        # players shop controller
-        for index, player in enumerate(self.players):
-            try:
-                if (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["LB"]
-                ):
-                    player.shop.toggle_open()
-            except IndexError:
-                pass
-
-        # players[0] using powers
-        if event.type == pg.KEYDOWN and event.key == pg.K_f:
-            if self.players[0].pay_for_power("more"):
-                self.players[1].activate_power("more")
-        elif event.type == pg.KEYDOWN and event.key == pg.K_g:
-            if self.players[0].pay_for_power("speed"):
-                self.players[1].activate_power("speed")
-        elif event.type == pg.KEYDOWN and event.key == pg.K_h:
-            if self.players[0].pay_for_power("heal"):
-                self.players[0].activate_power("heal")
-
-        # players[0] powers with controller
-        for index, player in enumerate(self.players):
-            enemy_player = (index % 2) + 1
-            try:
-                if (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["A"]
-                ):
-                    if player.pay_for_power("more"):
-                        self.players[enemy_player].activate_power("more")
-                elif (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["B"]
-                ):
-                    if player.pay_for_power("speed"):
-                        self.players[enemy_player].activate_power("speed")
-                elif (
-                    event.type == pg.JOYBUTTONDOWN
-                    and joysticks[index].get_instance_id() == event.instance_id
-                    and event.button == XBOX360["X"]
-                ):
-                    if player.pay_for_power("heal"):
-                        player.activate_power("heal")
-            except IndexError:
-                pass
-
-        # players[1] using powers
-        if event.type == pg.KEYDOWN and event.key == pg.K_k:
-            if self.players[1].pay_for_power("more"):
-                self.players[0].activate_power("more")
-        elif event.type == pg.KEYDOWN and event.key == pg.K_l:
-            if self.players[1].pay_for_power("speed"):
-                self.players[0].activate_power("speed")
-        elif event.type == pg.KEYDOWN and event.key == pg.K_SEMICOLON:
-            if self.players[1].pay_for_power("heal"):
-                self.players[1].activate_power("heal")
-
-    def process_end_event(self, event):
-        if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-            for player in self.players:
-                player.reset()
-            self.game_state = MENU
-            self.initialize_menu_background()
-            self.victory_sound.stop()
-            pg.mixer.music.play(-1)
-        if event.type == JOYBUTTONDOWN and event.button == XBOX360["A"]:
-            for player in self.players:
-                player.reset()
-            self.game_state = MENU
-            self.initialize_menu_background()
-            self.victory_sound.stop()
-            pg.mixer.music.play(-1)
+    def process_event(self, event):
+        self.input.route(event)
+
+    def start_select(self):
+        self.initialize_game_worlds()
+        for player in self.players:
+            player.start()
+        self.game_state = SELECT
+        SOUNDS.play("button_sound.wav")
+
+    def change_number_of_players(self, step):
+        if 2 <= self.number_of_players + step <= MAX_PLAYERS:
+            self.number_of_players += step
+            SOUNDS.play("select_sound.wav")
+
+    def pick_theme(self, index, step, unless_ready=False, sound=True):
+        """Switch a player to the previous or next character on the select screen"""
+        player = self.players[index]
+        if unless_ready and player.ready:
+            return
+        theme = self.themes[(self.themes.index(player.get_theme()) + step) % 4]
+        player.init_character(theme)
+        if sound:
+            SOUNDS.play("select_sound.wav")
+
+    def toggle_ready(self, index):
+        self.players[index].ready = not self.players[index].ready
+        SOUNDS.play("button_sound.wav")
+
+    def buy_power(self, index, power_name, target):
+        """Player index pays for a power that acts on player target"""
+        if self.players[index].pay_for_power(power_name):
+            self.players[target].activate_power(power_name)
+
+    def return_to_menu(self):
+        for player in self.players:
+            player.reset()
+        self.game_state = MENU
+        self.initialize_menu_background()
+        SOUNDS.stop("victory.wav")
+        SOUNDS.play_music()
+
+    def export_profile(self):
+        path = time.strftime("frame_trace_%Y%m%d_%H%M%S.json")
+        PROFILER.export_trace(path)
+        print("Wrote frame trace to", path)
+
+    def start_match(self):
+        self.game_state = GAME
+        SOUNDS.play("button_sound.wav")
+        if self.record_path:
+            self.recorder = replay.Recorder(self.record_path, self.players)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def tick(self):
+        """Advance whatever the current state simulates by one fixed step"""
+        if self.game_state == MENU:
+            self.scrolling_menu_background.slide([-1, -1])
+        elif self.game_state == GAME:
+            self.game_tick()
 
     def menu_loop(self):
-        self.scrolling_menu_background.slide([-1, -1])
-        music_ms = pg.mixer.music.get_pos()
+        music_ms = SOUNDS.music_pos()
         music_s = music_ms / 1000
         # Fishing song is 120bpm. Divide by 2 for 60bpm or 1bps and 4 beats makes a bar.
         val = (music_s % 8) / 2
         if self.menu_theme != math.floor(val):
             self.menu_theme = math.floor(val)
+            old_background = self.scrolling_menu_background.sprite_dict
             self.scrolling_menu_background.set_sprite_dict(
-                helper.create_background(self.themes[self.menu_theme], helper.WIN_SIZE)
+                helper.create_background(
+                    self.themes[self.menu_theme], helper.WIN_SIZE, self.menu_seed
+                )
             )
+            helper.release_background(old_background)
         self.scrolling_menu_background.draw(
             self.background_surface, self.screen.get_size()
         )
@@ -586,41 +503,111 @@ class Game:
         self.draw_number_players_selector()
 
     def select_loop(self):
+        self.redraw_worlds(SELECT)
         self.draw_select_background()
         for i in self.players:
             i.draw_world()
             i.draw_select()
 
-    def game_loop(self):
+    def game_loop(self, alpha=1.0):
+        self.redraw_worlds(GAME)
+        drawn = []
         for i in self.players:
-            i.move()
-            i.update_world()
-        self.draw_game_background()
+            if not i.full_redraw and not self.budget.should_draw(i.index):
+                continue
+            start = time.perf_counter()
+            with PROFILER.phase("draw", i.index):
+                i.draw_world(alpha)
+            self.budget.record(i.index, time.perf_counter() - start)
+            drawn.append(i)
+        with PROFILER.phase("present"):
+            self.draw_game_background(drawn)
+
+    def game_tick(self):
+        if self.use_workers:
+            with PROFILER.phase("workers"):
+                workers.tick_all(self.players)
+        else:
+            for i in self.players:
+                i.tick()
+        SOUNDS.flush()
+        if self.recorder is not None:
+            self.recorder.end_tick()
 
         players_left = 0
         for player in self.players:
             players_left += player.get_player().is_alive()
 
         if players_left < 2:
+            self.stop_recording()
             self.game_state = END
             self.draw_end_background()
-            pg.mixer.music.stop()
-            self.victory_sound.play()
+            SOUNDS.stop_music()
+            SOUNDS.play("victory.wav")
 
     def end_loop(self):
         self.screen.blit(self.background_surface, (0, 0))
 
     def initialize_game_worlds(self):
+        for player in self.players:
+            player.close()
         self.players = []
-        world_size = ((512 * 3) // 2, (288 * 3))
-        if self.number_of_players > 2:
-            world_size = ((512 * 3) // 2, (288 * 3) // 2)
-        for i in range(self.number_of_players):
-            self.players.append(World(dims=world_size, theme=self.themes[i]))
+        self.layout = Layout(self.screen.get_size(), self.number_of_players)
+        self.budget = RenderBudget(self.number_of_players)
+        world_class = workers.WorkerWorld if self.use_workers else World
+        for i, surface in enumerate(self.layout.surfaces(self.screen)):
+            world = world_class(
+                dims=self.layout.world_size(),
+                theme=self.themes[i % len(self.themes)],
+                seed=self.random.randrange(2**32),
+                surface=surface,
+            )
+            world.index = i
+            self.players.append(world)
+        self.input.invalidate()
 
 
 # Game Over
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=GAME_NAME)
+    parser.add_argument(
+        "--workers",
+        action="store_true",
+        help="simulate each player's world in its own process",
+    )
+    parser.add_argument("--seed", type=int, help="seed for a reproducible match")
+    parser.add_argument(
+        "--record", metavar="PATH", help="record the match for replay.py"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="start with the frame profiler overlay on (toggle with F3)",
+    )
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="print how long each step of starting up took",
+    )
+    parser.add_argument(
+        "--unscaled",
+        action="store_true",
+        help="open a fixed window at the game's size, where only the regions "
+        "that changed are pushed to the screen each frame",
+    )
+    args = parser.parse_args(argv)
+    PROFILER.enabled = args.profile
+    game = Game(
+        use_workers=args.workers,
+        seed=args.seed,
+        record_path=args.record,
+        scaled=not args.unscaled,
+    )
+    game.main(print_startup=args.startup)
+
+
 # this calls the 'main' function when this script is executed
-game = Game()
-game.main()
+if __name__ == "__main__":
+    main()
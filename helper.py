@@ -1,4 +1,7 @@
 import os
+import json
+from collections import OrderedDict
+from functools import lru_cache
 import pygame as pg
 from pygame import error as geterror
 from pygame.locals import *
@@ -9,6 +12,8 @@ import pygame.surfarray as surfarray
 import random
 import math
 
+import numpy as np
+
 WIN_SIZE = ((512 * 3) + 2, (288 * 3) + 2)
 
 
@@ -18,7 +23,8 @@ WIN_SIZE = ((512 * 3) + 2, (288 * 3) + 2)
 
 MAIN_DIR = os.path.split(os.path.abspath(__file__))[0]
 DATA_DIR = os.path.join(MAIN_DIR, "data")
-IMAGE_PATHS = [
+# sprites with fixed paths; image_paths() adds the tilesets found on disk
+SPRITE_PATHS = [
     (os.path.join(DATA_DIR, "sprite_priest", "sprite_priest_front.png"), 1),
     (os.path.join(DATA_DIR, "sprite_priest", "sprite_priest_back.png"), 1),
     (os.path.join(DATA_DIR, "sprite_priest", "sprite_priest_right.png"), 1),
@@ -50,29 +56,108 @@ IMAGE_PATHS = [
     (os.path.join(DATA_DIR, "sprite_pit", "pit_open.png"), 1),
 ]
 
-tilesets = os.path.join(DATA_DIR, "tilesets")
-for i in os.listdir(tilesets):
-    if os.path.isdir(os.path.join(tilesets, i)):
-        for j in os.listdir(os.path.join(tilesets, i)):
-            scale = 3 / 16
-            if j.endswith("png"):
-                if j[1:].startswith("pit"):
-                    if j == "Fpit.png":
-                        scale = scale * 2.5
-                    elif j == "Dpit.png":
-                        scale = scale * 1.5
-                    elif j == "Vpit.png":
-                        scale = scale * 2.9
-                    elif j == "Ppit.png":
-                        scale = scale * 2.7
-                IMAGE_PATHS.append((os.path.join(DATA_DIR, "tilesets", i, j), scale))
-            elif j == "Environment":
-                for k in os.listdir(os.path.join(tilesets, i, j)):
-                    if k.endswith("png"):
-                        IMAGE_PATHS.append(
-                            (os.path.join(DATA_DIR, "tilesets", i, j, k), scale * 2)
-                        )
-LOADED_IMAGES = {}
+TILESETS_DIR = os.path.join(DATA_DIR, "tilesets")
+
+
+@lru_cache(maxsize=None)
+def scan_tilesets():
+    """(image path, scale) of every tileset image, read from disk on first use"""
+    paths = []
+    for i in os.listdir(TILESETS_DIR):
+        if os.path.isdir(os.path.join(TILESETS_DIR, i)):
+            for j in os.listdir(os.path.join(TILESETS_DIR, i)):
+                scale = 3 / 16
+                if j.endswith("png"):
+                    if j[1:].startswith("pit"):
+                        if j == "Fpit.png":
+                            scale = scale * 2.5
+                        elif j == "Dpit.png":
+                            scale = scale * 1.5
+                        elif j == "Vpit.png":
+                            scale = scale * 2.9
+                        elif j == "Ppit.png":
+                            scale = scale * 2.7
+                    paths.append((os.path.join(TILESETS_DIR, i, j), scale))
+                elif j == "Environment":
+                    for k in os.listdir(os.path.join(TILESETS_DIR, i, j)):
+                        if k.endswith("png"):
+                            paths.append(
+                                (os.path.join(TILESETS_DIR, i, j, k), scale * 2)
+                            )
+    return tuple(paths)
+
+
+def image_paths():
+    """(image path, scale) of every image the game can load"""
+    return SPRITE_PATHS + list(scan_tilesets())
+
+
+def image_name(image_path):
+    return os.path.basename(image_path).split(".")[0]
+
+
+def tileset_images():
+    return [image_name(image_path) for image_path, _ in scan_tilesets()]
+
+
+class ImageRegistry(dict):
+    """Images by name, each loaded and scaled from image_paths() on first use.
+
+    `name in registry` is only true once the image is loaded; use known() to
+    ask whether it can be loaded at all."""
+
+    def __init__(self):
+        super().__init__()
+        # optional assetpack.AssetPack to take prebaked images from
+        self.pack = None
+        self._paths = None
+
+    @property
+    def paths(self):
+        """{name: (image path, scale)}, scanning the tilesets on first use"""
+        if self._paths is None:
+            self._paths = {
+                image_name(image_path): (image_path, scale)
+                for image_path, scale in image_paths()
+            }
+        return self._paths
+
+    def __missing__(self, name):
+        if self.pack is not None and name in self.pack:
+            image = self.pack.load(name)
+        elif name in self.paths:
+            image = load_scaled_image(*self.paths[name])
+        else:
+            raise KeyError(name)
+        self[name] = image
+        return image
+
+    def known(self, name):
+        return name in self or name in self.paths
+
+    def prefetch(self, names):
+        """Load the named images now rather than on the frame that first draws them"""
+        for name in names:
+            if name not in self:
+                self[name]
+
+
+LOADED_IMAGES = ImageRegistry()
+
+# Scaled sprite sizes for worlds that never load a Surface (headless mode)
+MANIFEST_PATH = os.path.join(DATA_DIR, "asset_manifest.json")
+ASSET_SIZES = {}
+
+
+class NoneSound:
+    def play(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def set_volume(self, volume):
+        pass
 
 
 def load_image(name, colorkey=(0, 0, 0, 255)):
@@ -91,10 +176,6 @@ def load_image(name, colorkey=(0, 0, 0, 255)):
 
 
 def load_sound(name):
-    class NoneSound:
-        def play(self):
-            pass
-
     if not pg.mixer or not pg.mixer.get_init():
         return NoneSound()
     if name.endswith(".mp3"):
@@ -111,10 +192,6 @@ def load_sound(name):
 
 
 def load_music(name):
-    class NoneSound:
-        def play(self):
-            pass
-
     if not pg.mixer or not pg.mixer.get_init():
         return NoneSound()
     if name.endswith(".mp3"):
@@ -131,98 +208,354 @@ def load_music(name):
     # return sound
 
 
+# mixer channels of each playback group, so menu sounds never queue behind a horde
+CHANNEL_GROUPS = {"ui": 2, "world": 14}
+# most copies of one sound a group plays at once
+VOICE_CAPS = {"coin_sound.wav": 3, "ouch.wav": 3, "pit_fall_down.wav": 2}
+DEFAULT_VOICE_CAP = 4
+
+
+class SoundBank:
+    """Every sound decoded once per process, played on reserved channel groups.
+
+    play() starts a sound now. cue() queues it for flush() at the end of the
+    tick, which plays each queued sound once however often it was cued. A
+    play is dropped when the sound is at its voice cap in its group or the
+    group has no free channel; stats counts played, merged and dropped plays.
+    The music methods do nothing without a mixer, and music_pos() then counts
+    from the last play_music() so the menu still keeps time."""
+
+    def __init__(self, groups=CHANNEL_GROUPS, voice_caps=VOICE_CAPS):
+        self.groups = groups
+        self.voice_caps = voice_caps
+        self.sounds = {}
+        # {group: [Channel]}, set up on the first play once the mixer is on
+        self.channels = None
+        self.pending = {}
+        self.music_start = 0
+        self.reset_stats()
+
+    def load(self, name, volume=None):
+        if name not in self.sounds:
+            self.sounds[name] = load_sound(name)
+        if volume is not None:
+            self.sounds[name].set_volume(volume)
+        return self.sounds[name]
+
+    def setup_channels(self):
+        """Reserve every channel, so only play() picks them and never pygame"""
+        total = sum(self.groups.values())
+        pg.mixer.set_num_channels(total)
+        pg.mixer.set_reserved(total)
+        self.channels = {}
+        first = 0
+        for group, count in self.groups.items():
+            self.channels[group] = [
+                pg.mixer.Channel(index) for index in range(first, first + count)
+            ]
+            first += count
+
+    def play(self, name, group="ui"):
+        sound = self.load(name)
+        if isinstance(sound, NoneSound):
+            return
+        if self.channels is None:
+            self.setup_channels()
+        channels = self.channels[group]
+        voices = sum(channel.get_sound() is sound for channel in channels)
+        free = [channel for channel in channels if not channel.get_busy()]
+        if voices >= self.voice_caps.get(name, DEFAULT_VOICE_CAP) or not free:
+            self.stats["dropped"][name] = self.stats["dropped"].get(name, 0) + 1
+            return
+        free[0].play(sound)
+        self.stats["played"][name] = self.stats["played"].get(name, 0) + 1
+
+    def cue(self, name, group="world"):
+        if name in self.pending:
+            self.stats["merged"][name] = self.stats["merged"].get(name, 0) + 1
+        else:
+            self.pending[name] = group
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for name, group in pending.items():
+            self.play(name, group)
+
+    def stop(self, name):
+        self.load(name).stop()
+
+    def reset_stats(self):
+        self.stats = {"played": {}, "merged": {}, "dropped": {}}
+
+    def has_music(self):
+        return bool(pg.mixer and pg.mixer.get_init())
+
+    def play_music(self, name=None, volume=None):
+        """Loop the music from the start, loading name first if given"""
+        self.music_start = pg.time.get_ticks()
+        if not self.has_music():
+            return
+        if name is not None:
+            load_music(name)
+        if volume is not None:
+            pg.mixer.music.set_volume(volume)
+        pg.mixer.music.play(-1)
+
+    def toggle_music(self):
+        if not self.has_music():
+            return
+        if pg.mixer.music.get_busy():
+            pg.mixer.music.pause()
+        else:
+            pg.mixer.music.unpause()
+
+    def stop_music(self):
+        if self.has_music():
+            pg.mixer.music.stop()
+
+    def music_pos(self):
+        """Milliseconds the music has played, like pg.mixer.music.get_pos()"""
+        if self.has_music():
+            return pg.mixer.music.get_pos()
+        return pg.time.get_ticks() - self.music_start
+
+
+SOUNDS = SoundBank()
+
+LOADED_FONTS = {}
+
+
+def load_font(name, size):
+    """Font from DATA_DIR, loaded once per (file, size). None is pygame's default"""
+    key = (name, size)
+    if key not in LOADED_FONTS:
+        path = None if name is None else os.path.join(DATA_DIR, name)
+        LOADED_FONTS[key] = pg.font.Font(path, size)
+    return LOADED_FONTS[key]
+
+
+class TextCache:
+    """LRU cache of rendered text. The surfaces are shared, so never draw on them"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font_name, size, text, color, antialias=True):
+        key = (font_name, size, text, tuple(color), bool(antialias))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = load_font(font_name, size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.surfaces)}
+
+
+TEXT_CACHE = TextCache()
+
+
+def render_text(font_name, size, text, color, antialias=True):
+    return TEXT_CACHE.render(font_name, size, text, color, antialias)
+
+
+def load_scaled_image(image_path, scale):
+    img = load_image(image_path)
+    dims = (int(img[0].get_width() * scale), int(img[0].get_height() * scale))
+    return pg.transform.scale(img[0], dims)
+
+
 def load_all_images():
-    for image_path, scale in IMAGE_PATHS:
-        image_name = os.path.basename(image_path).split(".")[0]
-        img = load_image(image_path)
-        dims = (int(img[0].get_width() * scale), int(img[0].get_height() * scale))
-        img = (pg.transform.scale(img[0], dims), img[1])
-        LOADED_IMAGES.update({image_name: img[0]})
-
-
-def create_background(name, world_size, dummy=None):
-    # Check world size to know how big a road to make
-    # roads = [
-    #     '           |    ',
-    #     '           |    ',
-    #     '---D    R--L  R-',
-    #     '   U-D 123    | ',
-    #     '     U-456----L ',
-    #     '       789      ',
-    #     '        |       ',
-    #     '        U--D    ',
-    #     '           |    '
-    #     ]
-    if True or number_of_players == 0:
-        roads = [
-            "           |    ",
-            "           |    ",
-            "---D    R--L  R-",
-            "   U-D 123    | ",
-            "     U-456----L ",
-            "       789      ",
-            "        |       ",
-            "        U--D    ",
-            "           |    ",
-        ]
-        for i in range(len(roads)):
-            while len(roads[i]) < int(world_size[0]):
-                roads[i] = roads[i] + roads[i][-1]
-        while len(roads) < int(world_size[1]):
-            roads.append("           |    " + " " * (int(world_size[0]) - 16))
-
-    feature_counts = {"FARMER": 22, "DEMON": 19, "PRIEST": 17, "VIKING": 21}
-    dims = (world_size[0] // 48, world_size[1] // 48)
-    adjusted_world_size = [
-        world_size[0] - world_size[0] % 48,
-        world_size[1] - world_size[1] % 48,
+    """Eagerly load everything; LOADED_IMAGES otherwise loads images on first use"""
+    LOADED_IMAGES.prefetch(LOADED_IMAGES.paths)
+
+
+def theme_images(theme):
+    """Tiles, environment props and building of a theme's tileset"""
+    return [name for name in tileset_images() if name.startswith(theme[0])]
+
+
+def prefetch_theme(theme):
+    LOADED_IMAGES.prefetch(theme_images(theme))
+
+
+def build_asset_manifest():
+    """Sizes of every image after scaling, read without a display"""
+    manifest = {}
+    for image_path, scale in image_paths():
+        width, height = pg.image.load(image_path).get_size()
+        manifest[image_name(image_path)] = (int(width * scale), int(height * scale))
+    return manifest
+
+
+def write_asset_manifest(path=MANIFEST_PATH):
+    with open(path, "w") as manifest_file:
+        json.dump(build_asset_manifest(), manifest_file, indent=2, sort_keys=True)
+
+
+def load_asset_manifest(path=MANIFEST_PATH):
+    """Fill ASSET_SIZES from the manifest file, or from the images if it is missing"""
+    if os.path.exists(path):
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    else:
+        manifest = build_asset_manifest()
+    ASSET_SIZES.update({name: tuple(size) for name, size in manifest.items()})
+
+
+def get_image_size(name):
+    if name not in LOADED_IMAGES and name in ASSET_SIZES:
+        return ASSET_SIZES[name]
+    return LOADED_IMAGES[name].get_size()
+
+
+class BackgroundCache:
+    """Generated backgrounds in LOADED_IMAGES, keyed by (theme, size, seed).
+
+    Backgrounds are reference counted. Released ones stay cached for reuse until
+    more than max_unused are idle, then the least recently released is evicted."""
+
+    def __init__(self, max_unused=8):
+        self.max_unused = max_unused
+        self.refs = {}
+        self.unused = OrderedDict()
+
+    def acquire(self, name, world_size, seed=0):
+        key = ("background", name, tuple(world_size), seed)
+        if key not in LOADED_IMAGES:
+            LOADED_IMAGES[key] = render_background(
+                name, world_size, random.Random(seed)
+            )
+        self.unused.pop(key, None)
+        self.refs[key] = self.refs.get(key, 0) + 1
+        return {"DOWN": key}
+
+    def release(self, sprite_dict):
+        key = sprite_dict["DOWN"]
+        self.refs[key] -= 1
+        if self.refs[key] == 0:
+            del self.refs[key]
+            self.unused[key] = True
+            while len(self.unused) > self.max_unused:
+                evicted, _ = self.unused.popitem(last=False)
+                del LOADED_IMAGES[evicted]
+
+
+BACKGROUNDS = BackgroundCache()
+
+
+def create_background(name, world_size, seed=0):
+    """Sprite dict for a shared background; hand it back with release_background"""
+    return BACKGROUNDS.acquire(name, world_size, seed)
+
+
+def release_background(sprite_dict):
+    BACKGROUNDS.release(sprite_dict)
+
+
+# one screen of roads, a glyph per tile; rows repeat their last glyph to the
+# right and the road running down continues below
+ROADS = [
+    "           |    ",
+    "           |    ",
+    "---D    R--L  R-",
+    "   U-D 123    | ",
+    "     U-456----L ",
+    "       789      ",
+    "        |       ",
+    "        U--D    ",
+    "           |    ",
+]
+ROAD_BELOW = "           |    "
+TILE_SIZE = 48
+FEATURE_COUNTS = {"FARMER": 22, "DEMON": 19, "PRIEST": 17, "VIKING": 21}
+GRASS = 0
+GRASS_TILES = ["43", "52"]
+# tile number of each road glyph; GRASS cells pick one of GRASS_TILES
+ROAD_TILES = np.full(256, -1, dtype=np.int16)
+ROAD_TILES[ord(" ")] = GRASS
+for glyph, tile in {"-": 41, "|": 38, "U": 34, "R": 28, "L": 36, "D": 30}.items():
+    ROAD_TILES[ord(glyph)] = tile
+for digit in range(10):
+    ROAD_TILES[ord(str(digit))] = 18 + digit
+for digit, tile in {2: 11, 4: 13, 6: 15, 8: 17}.items():
+    ROAD_TILES[ord(str(digit))] = tile
+
+
+def road_grid(columns, rows):
+    """Tile number of every cell, rows by columns, GRASS where there is no road"""
+    lines = [
+        line[:columns].ljust(columns, line[-1])
+        for line in (ROADS + [ROAD_BELOW] * max(rows - len(ROADS), 0))[:rows]
+    ]
+    glyphs = np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8)
+    return ROAD_TILES[glyphs].reshape(rows, columns)
+
+
+@lru_cache(maxsize=512)
+def scaled_image(name, size):
+    """LOADED_IMAGES[name] at size, made once per size a background needs"""
+    image = LOADED_IMAGES[name]
+    if image.get_size() == size:
+        return image
+    return pg.transform.scale(image, size)
+
+
+def render_background(name, world_size, rng):
+    """A theme's ground of TILE_SIZE tiles and props stretched over world_size.
+
+    The tiles come from a grid of tile numbers and are drawn at their
+    stretched size with one Surface.blits. rng is drawn from cell by cell,
+    column after column, so a seed always makes the same background."""
+    width, height = world_size
+    columns, rows = width // TILE_SIZE, height // TILE_SIZE
+    bg = pg.Surface(world_size)
+    if not columns or not rows:
+        return bg
+    grid = road_grid(columns, rows)
+    # column-major, like the draws from rng
+    grass = np.argwhere(grid.T == GRASS)
+    grid[grass[:, 1], grass[:, 0]] = [
+        int(rng.choice(GRASS_TILES)) for _ in range(len(grass))
+    ]
+
+    # cell edges on the stretched background
+    xs = (np.arange(columns + 1) * width // columns).tolist()
+    ys = (np.arange(rows + 1) * height // rows).tolist()
+    blits = [
+        (
+            scaled_image(name[0] + str(tile), (xs[i + 1] - xs[i], ys[j + 1] - ys[j])),
+            (xs[i], ys[j]),
+        )
+        for (j, i), tile in np.ndenumerate(grid)
     ]
-    bg = pg.Surface(adjusted_world_size)
-    for i in range(dims[0]):
-        for j in range(dims[1]):
-            if roads[j][i] == " ":
-                tile = random.choice(["43", "52"])
-            elif roads[j][i] == "-":
-                tile = "41"
-            elif roads[j][i] == "|":
-                tile = "38"
-            elif roads[j][i] == "U":
-                tile = "34"
-            elif roads[j][i] == "R":
-                tile = "28"
-            elif roads[j][i] == "L":
-                tile = "36"
-            elif roads[j][i] == "D":
-                tile = "30"
-            elif roads[j][i] == "2":
-                tile = "11"
-            elif roads[j][i] == "4":
-                tile = "13"
-            elif roads[j][i] == "6":
-                tile = "15"
-            elif roads[j][i] == "8":
-                tile = "17"
-            elif roads[j][i].isdigit():
-                tile = str(18 + int(roads[j][i]))
-
-            bg.blit(LOADED_IMAGES[name[0] + tile], (i * 48, j * 48))
-    for i in range(dims[0] - 1):
-        for j in range(dims[1] - 1):
-            if roads[j][i] == " " and random.random() > 0.95:
-                num = str(random.randint(1, feature_counts[name]))
-                if len(num) == 1:
-                    num = "0" + num
-                img = LOADED_IMAGES[name[0] + "E" + num]
-                rect = img.get_rect(topleft=(i * 48, j * 48))
-                # z = (i*48, j*48)
-                bg.blit(img, rect)
-
-    bg = pg.transform.scale(bg, world_size)
-    id = 0
-    while id in LOADED_IMAGES:
-        id += 1
-    LOADED_IMAGES.update({id: bg})
-    return {"DOWN": id}
+    for i, j in grass:
+        if i < columns - 1 and j < rows - 1 and rng.random() > 0.95:
+            prop = "{}E{:02d}".format(name[0], rng.randint(1, FEATURE_COUNTS[name]))
+            prop_width, prop_height = get_image_size(prop)
+            size = (
+                prop_width * width // (columns * TILE_SIZE),
+                prop_height * height // (rows * TILE_SIZE),
+            )
+            blits.append((scaled_image(prop, size), (xs[i], ys[j])))
+    bg.blits(blits, doreturn=False)
+    return bg
+
+
+def create_headless_background(world_size):
+    """Size-only stand-in for create_background used by headless worlds"""
+    name = "background_{}x{}".format(*world_size)
+    ASSET_SIZES[name] = tuple(world_size)
+    return {"DOWN": name}
 
 
 def create_sprite_dict(sprite):
@@ -0,0 +1,274 @@
+"""Route input events to the Game and World actions they trigger.
+
+Every game state has a dispatch table keyed by (event type, device, key or
+button), where device is None for the keyboard and a joystick's instance id
+otherwise. A table is built the first time its state is entered and again
+after the players or controllers change, so routing an event is one
+dictionary lookup. Stick motion is coalesced to the latest value per axis
+and applied once per frame by flush()."""
+
+import pygame as pg
+
+KEYBOARD = None
+# stick deflection below this counts as centred
+AXIS_DEADZONE = 0.3
+XBOX360 = {"A": 0, "B": 1, "X": 2, "Y": 3, "LB": 4, "RB": 5}
+P1DIRS = {
+    pg.K_w: "UP",
+    pg.K_s: "DOWN",
+    pg.K_a: "LEFT",
+    pg.K_d: "RIGHT",
+    pg.K_f: "MORE",
+    pg.K_g: "SPEED",
+    pg.K_h: "HEAL",
+}
+P2DIRS = {
+    pg.K_UP: "UP",
+    pg.K_DOWN: "DOWN",
+    pg.K_LEFT: "LEFT",
+    pg.K_RIGHT: "RIGHT",
+    pg.K_k: "MORE",
+    pg.K_l: "SPEED",
+    pg.K_SEMICOLON: "HEAL",
+}
+# powers bought with (player 1 key, player 2 key, controller button), and
+# whether they act on the buyer rather than an opponent
+POWER_BINDINGS = [
+    ("more", pg.K_f, pg.K_k, XBOX360["A"], False),
+    ("speed", pg.K_g, pg.K_l, XBOX360["B"], False),
+    ("heal", pg.K_h, pg.K_SEMICOLON, XBOX360["X"], True),
+]
+# everything else is dropped by SDL before it reaches the event queue
+ROUTED_EVENTS = [
+    pg.QUIT,
+    pg.KEYDOWN,
+    pg.KEYUP,
+    pg.VIDEORESIZE,
+    pg.JOYAXISMOTION,
+    pg.JOYHATMOTION,
+    pg.JOYBUTTONDOWN,
+    pg.JOYDEVICEADDED,
+    pg.JOYDEVICEREMOVED,
+]
+
+
+class InputRouter:
+    """Dispatch tables for the game states named in states, {state: name}.
+
+    The table of a state comes from the router's <name>_bindings method."""
+
+    def __init__(self, game, states):
+        self.game = game
+        self.states = states
+        # one slot per controller in the order they connected, the index of
+        # the player it controls; None once unplugged
+        self.joysticks = []
+        self.tables = {}
+        # latest (player index, value) of every stick axis moved this frame
+        self.pending_axes = {}
+
+    def allow_events(self):
+        pg.event.set_blocked(None)
+        pg.event.set_allowed(ROUTED_EVENTS)
+
+    def invalidate(self):
+        """Build the tables again, after the players or controllers changed"""
+        self.tables = {}
+
+    def route(self, event):
+        if event.type == pg.JOYDEVICEADDED:
+            self.device_added(event.device_index)
+        elif event.type == pg.JOYDEVICEREMOVED:
+            self.device_removed(event.instance_id)
+        elif event.type == pg.JOYAXISMOTION:
+            slot = self.slot(event.instance_id)
+            if self.states.get(self.game.game_state) == "game" and slot is not None:
+                self.pending_axes[(slot, event.axis)] = event.value
+        else:
+            for action in self.table().get(event_key(event), ()):
+                action(event)
+
+    def flush(self):
+        """Apply the last stick position of each axis moved since the last flush"""
+        for (slot, axis), value in self.pending_axes.items():
+            if slot < len(self.game.players):
+                if abs(value) <= AXIS_DEADZONE:
+                    value = 0.0
+                self.game.players[slot].set_dir(axis, value)
+        self.pending_axes.clear()
+
+    def device_added(self, device_index):
+        joystick = pg.joystick.Joystick(device_index)
+        if self.slot(joystick.get_instance_id()) is not None:
+            return
+        if None in self.joysticks:
+            self.joysticks[self.joysticks.index(None)] = joystick
+        else:
+            self.joysticks.append(joystick)
+        self.invalidate()
+
+    def device_removed(self, instance_id):
+        slot = self.slot(instance_id)
+        if slot is not None:
+            self.joysticks[slot] = None
+        self.invalidate()
+
+    def slot(self, instance_id):
+        for index, joystick in enumerate(self.joysticks):
+            if joystick is not None and joystick.get_instance_id() == instance_id:
+                return index
+        return None
+
+    def controllers(self):
+        """(player index, instance id) of every connected controller"""
+        return [
+            (index, joystick.get_instance_id())
+            for index, joystick in enumerate(self.joysticks)
+            if joystick is not None
+        ]
+
+    def table(self):
+        state = self.game.game_state
+        if state not in self.tables:
+            table = {}
+            for key, action in getattr(self, self.states[state] + "_bindings")():
+                table.setdefault(key, []).append(action)
+            self.tables[state] = table
+        return self.tables[state]
+
+    def any_controller(self, button, action):
+        return [
+            ((pg.JOYBUTTONDOWN, instance_id, button), action)
+            for _, instance_id in self.controllers()
+        ]
+
+    def player_controllers(self):
+        """(player index, instance id) of the controllers that have a world"""
+        return [
+            (index, instance_id)
+            for index, instance_id in self.controllers()
+            if index < len(self.game.players)
+        ]
+
+    def menu_bindings(self):
+        fewer = call(self.game.change_number_of_players, -1)
+        more = call(self.game.change_number_of_players, 1)
+        start = call(self.game.start_select)
+        return (
+            [
+                ((pg.KEYDOWN, KEYBOARD, pg.K_SPACE), start),
+                ((pg.KEYDOWN, KEYBOARD, pg.K_a), fewer),
+                ((pg.KEYDOWN, KEYBOARD, pg.K_LEFT), fewer),
+                ((pg.KEYDOWN, KEYBOARD, pg.K_d), more),
+                ((pg.KEYDOWN, KEYBOARD, pg.K_RIGHT), more),
+            ]
+            + self.any_controller(XBOX360["A"], start)
+            + self.any_controller(XBOX360["LB"], fewer)
+            + self.any_controller(XBOX360["RB"], more)
+        )
+
+    def select_bindings(self):
+        game = self.game
+        bindings = [
+            ((pg.KEYDOWN, KEYBOARD, pg.K_SPACE), call(game.start_match)),
+            (
+                (pg.KEYDOWN, KEYBOARD, pg.K_a),
+                call(game.pick_theme, 0, -1, unless_ready=True),
+            ),
+            (
+                (pg.KEYDOWN, KEYBOARD, pg.K_d),
+                call(game.pick_theme, 0, 1, unless_ready=True),
+            ),
+            ((pg.KEYDOWN, KEYBOARD, pg.K_LEFT), call(game.pick_theme, 1, -1)),
+            ((pg.KEYDOWN, KEYBOARD, pg.K_RIGHT), call(game.pick_theme, 1, 1)),
+            ((pg.KEYDOWN, KEYBOARD, pg.K_q), call(game.toggle_ready, 0)),
+        ] + self.any_controller(XBOX360["A"], call(game.start_match))
+        for index, instance_id in self.player_controllers():
+            bindings += [
+                (
+                    (pg.JOYBUTTONDOWN, instance_id, XBOX360["LB"]),
+                    call(game.pick_theme, index, -1, sound=False),
+                ),
+                (
+                    (pg.JOYBUTTONDOWN, instance_id, XBOX360["RB"]),
+                    call(game.pick_theme, index, 1, sound=False),
+                ),
+            ]
+        return bindings
+
+    def game_bindings(self):
+        game = self.game
+        players = game.players
+        bindings = []
+        for index, dirs in [(0, P1DIRS), (1, P2DIRS)]:
+            for key, name in dirs.items():
+                bindings += [
+                    (
+                        (pg.KEYDOWN, KEYBOARD, key),
+                        call(players[index].set_dir, name, 1),
+                    ),
+                    ((pg.KEYUP, KEYBOARD, key), call(players[index].set_dir, name, 0)),
+                ]
+        bindings += [
+            ((pg.KEYDOWN, KEYBOARD, pg.K_q), call(players[0].toggle_shop)),
+            ((pg.KEYDOWN, KEYBOARD, pg.K_p), call(players[1].toggle_shop)),
+        ]
+        for power, p1_key, p2_key, _, on_self in POWER_BINDINGS:
+            for index, key in [(0, p1_key), (1, p2_key)]:
+                target = index if on_self else 1 - index
+                bindings.append(
+                    (
+                        (pg.KEYDOWN, KEYBOARD, key),
+                        call(game.buy_power, index, power, target),
+                    )
+                )
+
+        for index, instance_id in self.player_controllers():
+            bindings += [
+                ((pg.JOYHATMOTION, instance_id, None), hat_motion(players[index])),
+                (
+                    (pg.JOYBUTTONDOWN, instance_id, XBOX360["LB"]),
+                    call(players[index].toggle_shop),
+                ),
+            ]
+            for power, _, _, button, on_self in POWER_BINDINGS:
+                target = index if on_self else opponent(index, len(players))
+                bindings.append(
+                    (
+                        (pg.JOYBUTTONDOWN, instance_id, button),
+                        call(game.buy_power, index, power, target),
+                    )
+                )
+        return bindings
+
+    def end_bindings(self):
+        back = call(self.game.return_to_menu)
+        return [((pg.KEYDOWN, KEYBOARD, pg.K_SPACE), back)] + self.any_controller(
+            XBOX360["A"], back
+        )
+
+
+def call(function, *args, **kwargs):
+    """An action running function(*args, **kwargs) whatever the event"""
+    return lambda event: function(*args, **kwargs)
+
+
+def hat_motion(world):
+    return lambda event: world.set_dir(0, event.value)
+
+
+def event_key(event):
+    if event.type in (pg.KEYDOWN, pg.KEYUP):
+        return (event.type, KEYBOARD, event.key)
+    elif event.type == pg.JOYBUTTONDOWN:
+        return (event.type, event.instance_id, event.button)
+    elif event.type == pg.JOYHATMOTION:
+        return (event.type, event.instance_id, None)
+    return (event.type, None, None)
+
+
+def opponent(index, player_count):
+    """Whom a controller's attack powers hit: the next player of the pair,
+    or player 1 when that player is not in the match"""
+    target = (index % 2) + 1
+    return target if target < player_count else 0
@@ -0,0 +1,148 @@
+import math
+from functools import lru_cache
+
+import pygame as pg
+
+# pixels between neighbouring viewports
+GUTTER = 2
+MAX_PLAYERS = 8
+# seconds of drawing per frame shared by all viewports, see RenderBudget
+DRAW_BUDGET = 1 / 120
+# frames a viewport may keep its last picture at most
+MAX_SKIPPED_FRAMES = 3
+# weight of the newest draw time in a viewport's running cost
+COST_SMOOTHING = 0.2
+
+
+class Layout:
+    """Where each player's world sits on the screen.
+
+    Every world draws straight into a subsurface of the display at its
+    viewport, so nothing is copied to the screen afterwards. The gutters are
+    the parts of the screen no viewport covers; only they are ever cleared."""
+
+    def __init__(self, screen_size, count):
+        viewports, gutters = grid_layout(tuple(screen_size), count)
+        self.screen_size = tuple(screen_size)
+        self.viewports = [pg.Rect(rect) for rect in viewports]
+        self.gutters = [pg.Rect(rect) for rect in gutters]
+
+    def world_size(self):
+        return self.viewports[0].size if self.viewports else (0, 0)
+
+    def surfaces(self, screen):
+        """A subsurface of screen for each viewport, in player order"""
+        return [screen.subsurface(rect) for rect in self.viewports]
+
+    def clear_gutters(self, screen, color=(0, 0, 0)):
+        for rect in self.gutters:
+            screen.fill(color, rect)
+        return list(self.gutters)
+
+
+class RenderBudget:
+    """Shares DRAW_BUDGET between the viewports of a match.
+
+    A world whose recent draws cost more than its share is drawn only every
+    few frames, up to MAX_SKIPPED_FRAMES skipped in a row, and keeps its last
+    picture on the screen in between. More players then cost each viewport
+    some smoothness instead of slowing every frame down."""
+
+    def __init__(self, count, budget=DRAW_BUDGET):
+        self.share = budget / max(count, 1)
+        self.costs = [0.0] * count
+        self.skipped = [0] * count
+
+    def should_draw(self, index):
+        interval = min(
+            math.ceil(self.costs[index] / self.share), MAX_SKIPPED_FRAMES + 1
+        )
+        if self.skipped[index] + 1 >= interval:
+            return True
+        self.skipped[index] += 1
+        return False
+
+    def record(self, index, seconds):
+        """The time drawing the world at index took this frame"""
+        self.costs[index] += (seconds - self.costs[index]) * COST_SMOOTHING
+        self.skipped[index] = 0
+
+
+@lru_cache(maxsize=32)
+def grid_layout(screen_size, count):
+    """(viewport rects, gutter rects) of count equal worlds on the screen.
+
+    Tries every number of columns and keeps the grid whose cells score best:
+    their area, scaled down the further they are from square. A last row
+    with fewer worlds is centred."""
+    if count < 1:
+        return (), (tuple(pg.Rect((0, 0), screen_size)),)
+    width, height = screen_size
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        cell = (
+            (width - GUTTER * (columns - 1)) // columns,
+            (height - GUTTER * (rows - 1)) // rows,
+        )
+        if min(cell) <= 0:
+            continue
+        aspect = cell[0] / cell[1]
+        score = cell[0] * cell[1] * min(aspect, 1 / aspect)
+        if best is None or score > best[0]:
+            best = (score, columns, rows, cell)
+    _, columns, rows, (cell_width, cell_height) = best
+
+    viewports = []
+    top = (height - rows * cell_height - (rows - 1) * GUTTER) // 2
+    for row in range(rows):
+        in_row = min(columns, count - row * columns)
+        row_width = in_row * cell_width + (in_row - 1) * GUTTER
+        left = (width - row_width) // 2
+        for column in range(in_row):
+            viewports.append(
+                pg.Rect(
+                    left + column * (cell_width + GUTTER),
+                    top + row * (cell_height + GUTTER),
+                    cell_width,
+                    cell_height,
+                )
+            )
+    gutters = subtract_rects(pg.Rect((0, 0), screen_size), viewports)
+    return (
+        tuple(tuple(rect) for rect in viewports),
+        tuple(tuple(rect) for rect in gutters),
+    )
+
+
+def subtract_rects(area, holes):
+    """Rects covering the parts of area outside every hole"""
+    pieces = [pg.Rect(area)]
+    for hole in holes:
+        remaining = []
+        for piece in pieces:
+            overlap = piece.clip(hole)
+            if not overlap:
+                remaining.append(piece)
+                continue
+            # the bands above and below the hole, then left and right of it
+            remaining += [
+                pg.Rect(piece.left, piece.top, piece.width, overlap.top - piece.top),
+                pg.Rect(
+                    piece.left,
+                    overlap.bottom,
+                    piece.width,
+                    piece.bottom - overlap.bottom,
+                ),
+                pg.Rect(
+                    piece.left, overlap.top, overlap.left - piece.left, overlap.height
+                ),
+                pg.Rect(
+                    overlap.right,
+                    overlap.top,
+                    piece.right - overlap.right,
+                    overlap.height,
+                ),
+            ]
+        pieces = [piece for piece in remaining if piece.width > 0 and piece.height > 0]
+    return pieces
@@ -0,0 +1,102 @@
+"""Decode and scale images on a thread pool while the game keeps drawing.
+
+Worker threads load each PNG and scale it to its size from image_paths(), then
+hand back the raw pixels in the display's byte order. Only the main thread,
+which owns the display, turns them into Surfaces: poll() converts whatever
+has finished into LOADED_IMAGES, a few milliseconds' worth per call. An image
+drawn before its turn still loads on the spot through LOADED_IMAGES, and
+images in the asset pack are left to it, since mapping them costs nothing."""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame as pg
+
+from assetpack import COLORKEY, pixel_format
+from helper import LOADED_IMAGES
+
+# SDL_image and the scaler release the GIL, so threads decode in parallel
+MAX_WORKERS = 4
+# seconds of converting per poll, so no frame is held up for long
+POLL_BUDGET = 0.004
+
+
+def decode(image_path, scale, fmt):
+    """Pixels and size of the scaled image; safe off the main thread"""
+    try:
+        image = pg.image.load(image_path)
+    except pg.error:
+        print("Cannot load image:", image_path)
+        raise SystemExit(str(pg.get_error()))
+    size = (int(image.get_width() * scale), int(image.get_height() * scale))
+    return pg.image.tostring(pg.transform.scale(image, size), fmt), size
+
+
+class AssetLoader:
+    """Loads the named images in order in the background, see poll()"""
+
+    def __init__(self, names, max_workers=None):
+        self.format = pixel_format(pg.Surface((1, 1), pg.SRCALPHA).convert_alpha())
+        self.executor = ThreadPoolExecutor(
+            max_workers or min(MAX_WORKERS, os.cpu_count() or 1),
+            thread_name_prefix="asset-loader",
+        )
+        pack = LOADED_IMAGES.pack
+        # {name: future} in the order they were asked for
+        self.pending = {}
+        for name in names:
+            if name in self.pending or name in LOADED_IMAGES:
+                continue
+            if pack is not None and name in pack:
+                continue
+            image_path, scale = LOADED_IMAGES.paths[name]
+            self.pending[name] = self.executor.submit(
+                decode, image_path, scale, self.format
+            )
+        self.total = len(self.pending)
+
+    def ready(self, names):
+        return not any(name in self.pending for name in names)
+
+    def progress(self, names=None):
+        """Share of names, or of everything, already in LOADED_IMAGES"""
+        if names is None:
+            done = self.total - len(self.pending)
+            return done / self.total if self.total else 1.0
+        names = set(names)
+        waiting = sum(name in self.pending for name in names)
+        return 1 - waiting / len(names) if names else 1.0
+
+    def poll(self, budget=POLL_BUDGET):
+        """Convert finished images into LOADED_IMAGES for up to budget seconds"""
+        if not self.pending:
+            return
+        deadline = time.perf_counter() + budget
+        for name, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[name]
+            # drawn already, and so loaded on the spot
+            if name not in LOADED_IMAGES:
+                data, size = future.result()
+                image = pg.image.frombuffer(data, size, self.format).convert_alpha()
+                image.set_colorkey(COLORKEY, pg.RLEACCEL)
+                LOADED_IMAGES[name] = image
+            if time.perf_counter() >= deadline:
+                break
+        if not self.pending:
+            self.executor.shutdown()
+
+    def finish(self):
+        """Wait for every image and convert it"""
+        for future in list(self.pending.values()):
+            future.exception()
+        self.poll(budget=float("inf"))
+
+    def close(self):
+        """Drop whatever has not started decoding yet"""
+        for future in self.pending.values():
+            future.cancel()
+        self.executor.shutdown()
+        self.pending = {}
@@ -0,0 +1,197 @@
+"""Per-phase frame timings for finding where a frame's time goes.
+
+Code marks a phase with `with PROFILER.phase("draw", world=index):`. While
+the profiler is disabled that returns one shared do-nothing context manager,
+so the cost is a method call. Enabled, every phase keeps its last durations
+in a fixed-size ring buffer for the p50/p95/p99 overlay (F3 in game) and its
+last spans for export as Chrome trace-event JSON (F4), which chrome://tracing
+and Perfetto open."""
+
+import json
+import time
+from collections import deque
+
+import numpy as np
+import pygame as pg
+
+from helper import load_font
+
+# frames of history kept per phase
+CAPACITY = 600
+PERCENTILES = [50, 95, 99]
+# frames between overlay refreshes, so the numbers stay readable
+OVERLAY_INTERVAL = 30
+OVERLAY_FONT_SIZE = 20
+
+
+class RingBuffer:
+    """The last capacity values appended"""
+
+    def __init__(self, capacity=CAPACITY):
+        self.values = np.zeros(capacity)
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def filled(self):
+        return self.values[: min(self.count, len(self.values))]
+
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class Phase:
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.key, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.enabled = False
+        self.timings = {}
+        # (key, start ns, duration ns) of recent spans, for trace export
+        self.spans = deque(maxlen=capacity * 32)
+        self.overlay = None
+        self.overlay_age = OVERLAY_INTERVAL
+
+    def phase(self, name, world=None):
+        """Context manager timing name; world is the index of the world it is for"""
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, (world, name))
+
+    def add(self, key, start, duration):
+        if key not in self.timings:
+            self.timings[key] = RingBuffer(self.capacity)
+        self.timings[key].append(duration / 1e6)
+        self.spans.append((key, start, duration))
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.overlay = None
+        self.overlay_age = OVERLAY_INTERVAL
+
+    def clear(self):
+        self.timings = {}
+        self.spans.clear()
+
+    def stats(self):
+        """{(world, phase): [p50, p95, p99]} in milliseconds"""
+        return {
+            key: np.percentile(timings.filled(), PERCENTILES).tolist()
+            for key, timings in self.timings.items()
+            if timings.count
+        }
+
+    def overlay_rows(self):
+        rows = [["ms"] + ["p{}".format(p) for p in PERCENTILES]]
+        for (world, name), values in sorted(
+            self.stats().items(), key=lambda item: (item[0][0] is not None, item[0])
+        ):
+            label = name if world is None else "world {} {}".format(world + 1, name)
+            rows.append([label] + ["{:.2f}".format(value) for value in values])
+        return rows
+
+    def draw_overlay(self, surface, position=(8, 8)):
+        """Blit the percentile table onto surface and return the rect it covers"""
+        self.overlay_age += 1
+        if self.overlay is None or self.overlay_age >= OVERLAY_INTERVAL:
+            self.overlay = render_overlay(self.overlay_rows())
+            self.overlay_age = 0
+        return surface.blit(self.overlay, position)
+
+    def export_trace(self, path):
+        """Write the recorded spans as Chrome trace-event JSON"""
+        events = [
+            {
+                "name": name,
+                "cat": "frame",
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": duration / 1000,
+                "pid": 0,
+                "tid": 0 if world is None else world + 1,
+            }
+            for (world, name), start, duration in self.spans
+        ]
+        events += [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 0,
+                "tid": tid,
+                "args": {"name": "game" if tid == 0 else "world {}".format(tid)},
+            }
+            for tid in sorted({event["tid"] for event in events})
+        ]
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+def render_overlay(rows):
+    """Table of rows with a left aligned label and right aligned numbers.
+
+    Rendered straight from the font; the numbers change too often to be
+    worth a place in the shared text cache."""
+    font = load_font(None, OVERLAY_FONT_SIZE)
+    rendered = [
+        [font.render(cell, True, (255, 255, 255)) for cell in row] for row in rows
+    ]
+    widths = [max(row[i].get_width() for row in rendered) for i in range(len(rows[0]))]
+    line_height = font.get_linesize()
+    overlay = pg.Surface((sum(widths) + 12 * len(widths), line_height * len(rows) + 8))
+    overlay.fill((0, 0, 0))
+    for line, row in enumerate(rendered):
+        x = 4
+        for column, (text, width) in enumerate(zip(row, widths)):
+            offset = 0 if column == 0 else width - text.get_width()
+            overlay.blit(text, (x + offset, 4 + line * line_height))
+            x += width + 12
+    return overlay
+
+
+class Timeline:
+    """Named moments after start, like the steps of starting the game"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self):
+        """One line per mark: the step's own time, then the time since start"""
+        lines = []
+        last = self.start
+        for name, at in self.marks:
+            lines.append(
+                "{:<12} {:8.1f} ms {:8.1f} ms".format(
+                    name, (at - last) * 1000, (at - self.start) * 1000
+                )
+            )
+            last = at
+        return "\n".join(lines)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,170 @@
+"""Record the inputs of a match and replay it headlessly.
+
+A recording is a header with every world's seed and themes, followed by one
+record per input that changed a world and one per tick holding the crc32 of
+all worlds' state after it. Replaying re-creates the worlds from their seeds,
+feeds them the same inputs on the same ticks and stops at the first tick
+whose state hash differs.
+
+    python replay.py match.rec"""
+
+import struct
+import sys
+import time
+import zlib
+
+import helper
+from timestep import TICK_RATE
+from world import World
+
+MAGIC = b"FWRP"
+VERSION = 1
+# magic, version, tick rate, world width and height, number of worlds
+HEADER = struct.Struct("<4sHHHHB")
+# seed, theme, theme the world was started with
+WORLD = struct.Struct("<QBB")
+# tick, world, command
+RECORD = struct.Struct("<IBB")
+THEMES = ["VIKING", "PRIEST", "FARMER", "DEMON"]
+POWERS = ["shop_icon", "heal", "speed", "more"]
+COMMANDS = ["tick", "direction", "toggle_shop", "pay", "activate"]
+COMMAND_CODES = {command: code for code, command in enumerate(COMMANDS)}
+PAYLOADS = {
+    "tick": struct.Struct("<I"),
+    "direction": struct.Struct("<4d"),
+    "toggle_shop": struct.Struct("<"),
+    "pay": struct.Struct("<B"),
+    "activate": struct.Struct("<B"),
+}
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+class Recorder:
+    """Writes the inputs worlds report through World.record to a file"""
+
+    def __init__(self, path, worlds, tick_rate=TICK_RATE):
+        self.file = open(path, "wb")
+        self.tick = 0
+        self.file.write(
+            HEADER.pack(MAGIC, VERSION, tick_rate, *worlds[0].dims, len(worlds))
+        )
+        for index, world in enumerate(worlds):
+            world.recorder = self
+            world.index = index
+            self.file.write(
+                WORLD.pack(
+                    world.seed,
+                    THEMES.index(world.theme),
+                    THEMES.index(world.start_theme),
+                )
+            )
+        self.worlds = worlds
+
+    def record(self, world, command, *args):
+        if command in ["pay", "activate"]:
+            args = [POWERS.index(args[0])]
+        self.file.write(RECORD.pack(self.tick, world, COMMAND_CODES[command]))
+        self.file.write(PAYLOADS[command].pack(*args))
+
+    def end_tick(self):
+        """Log the state every world reached on this tick"""
+        self.record(0, "tick", state_hash(self.worlds))
+        self.tick += 1
+
+    def close(self):
+        for world in self.worlds:
+            world.recorder = None
+        self.file.close()
+
+
+def state_hash(worlds):
+    crc = 0
+    for world in worlds:
+        crc = zlib.crc32(world.state_hash().to_bytes(4, "little"), crc)
+    return crc
+
+
+def read_recording(path):
+    """(header dict, [(tick, world, command, args)]) of a recording file"""
+    with open(path, "rb") as recording:
+        data = recording.read()
+    magic, version, tick_rate, width, height, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} recording".format(path, VERSION))
+    offset = HEADER.size
+    worlds = []
+    for _ in range(count):
+        seed, theme, start_theme = WORLD.unpack_from(data, offset)
+        worlds.append((seed, THEMES[theme], THEMES[start_theme]))
+        offset += WORLD.size
+
+    records = []
+    while offset < len(data):
+        tick, world, code = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        command = COMMANDS[code]
+        args = PAYLOADS[command].unpack_from(data, offset)
+        offset += PAYLOADS[command].size
+        if command in ["pay", "activate"]:
+            args = (POWERS[args[0]],)
+        records.append((tick, world, command, args))
+    header = {"tick_rate": tick_rate, "dims": (width, height), "worlds": worlds}
+    return header, records
+
+
+def create_worlds(header):
+    """Headless worlds in the state the recorded match started from"""
+    worlds = []
+    for seed, theme, start_theme in header["worlds"]:
+        world = World(header["dims"], start_theme, headless=True, seed=seed)
+        world.start()
+        if theme != start_theme:
+            world.init_character(theme)
+        worlds.append(world)
+    return worlds
+
+
+def apply(world, command, args):
+    if command == "direction":
+        world.dir_dict.update(zip(["UP", "DOWN", "LEFT", "RIGHT"], args))
+    elif command == "toggle_shop":
+        world.toggle_shop()
+    elif command == "pay":
+        world.pay_for_power(*args)
+    elif command == "activate":
+        world.activate_power(*args)
+
+
+def replay(path, check=True):
+    """Re-simulate a recording as fast as possible; returns (ticks, seconds).
+
+    Raises ReplayMismatch at the first tick whose state differs from the
+    recording when check is set."""
+    helper.load_asset_manifest()
+    header, records = read_recording(path)
+    worlds = create_worlds(header)
+
+    ticks = 0
+    start = time.perf_counter()
+    for tick, index, command, args in records:
+        if command != "tick":
+            apply(worlds[index], command, args)
+            continue
+        for world in worlds:
+            world.tick()
+        if check and state_hash(worlds) != args[0]:
+            raise ReplayMismatch("State differs from the recording on tick %d" % tick)
+        ticks += 1
+    return ticks, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    ticks, seconds = replay(sys.argv[1])
+    print(
+        "Replayed {} ticks in {:.2f}s ({:.0f} ticks/s), state matched".format(
+            ticks, seconds, ticks / max(seconds, 1e-9)
+        )
+    )
@@ -1,8 +1,6 @@
-import os
-
 import pygame as pg
 
-from helper import LOADED_IMAGES, DATA_DIR
+from helper import LOADED_IMAGES, render_text
 
 STARTING_PRICE_LIST = [0, 2, 2, 2]
 STARTING_ABILITY_IMAGE_LIST = ["shop_icon", "heal", "speed", "more"]
@@ -19,92 +17,99 @@ CHARACTER_KEYS = {
 
 
 class Shop:
-    def __init__(self, player_sprite, closed_dims):
+    """Retained-mode shop widget.
+
+    The open and closed surfaces are composed once. A price change redraws
+    only that card's slot, and version counts every change so callers can
+    tell when the shop looks different."""
+
+    def __init__(self, player_sprite, closed_dims, headless=False):
         self.open = False
-        self.open_surface = pg.Surface((closed_dims[0], closed_dims[1] * 4.5))
-        self.closed_surface = pg.Surface(closed_dims)
-        self.shop_surface = self.closed_surface
-        self.shop_surface = self.shop_surface.convert()
+        self.closed_dims = closed_dims
+        self.headless = headless
+        self.version = 0
         self.shop_bg_color = (10, 150, 50)
         self.shop_card_dict = {}
 
         self.populate_card_list(player_sprite)
+        if headless:
+            self.open_surface = None
+            self.closed_surface = None
+            self.shop_surface = None
+        else:
+            self.open_surface = pg.Surface(
+                (closed_dims[0], closed_dims[1] * 4.5)
+            ).convert()
+            self.closed_surface = pg.Surface(closed_dims).convert()
+            self.compose_open_shop()
+            self.compose_closed_shop()
+            self.shop_surface = self.closed_surface
 
     def populate_card_list(self, player_sprite):
-        image_size = (self.closed_surface.get_width(), self.closed_surface.get_height())
-
         self.shop_card_list = [
             ShopCard(
-                STARTING_ABILITY_IMAGE_LIST[0],
-                LOADED_IMAGES[STARTING_ABILITY_IMAGE_LIST[0]],
-                STARTING_PRICE_LIST[0],
-                image_size,
-                CHARACTER_KEYS[player_sprite][STARTING_ABILITY_IMAGE_LIST[0]],
-            ),
-            ShopCard(
-                STARTING_ABILITY_IMAGE_LIST[1],
-                LOADED_IMAGES[STARTING_ABILITY_IMAGE_LIST[1]],
-                STARTING_PRICE_LIST[1],
-                image_size,
-                CHARACTER_KEYS[player_sprite][STARTING_ABILITY_IMAGE_LIST[1]],
-            ),
-            ShopCard(
-                STARTING_ABILITY_IMAGE_LIST[2],
-                LOADED_IMAGES[STARTING_ABILITY_IMAGE_LIST[2]],
-                STARTING_PRICE_LIST[2],
-                image_size,
-                CHARACTER_KEYS[player_sprite][STARTING_ABILITY_IMAGE_LIST[2]],
-            ),
-            ShopCard(
-                STARTING_ABILITY_IMAGE_LIST[3],
-                LOADED_IMAGES[STARTING_ABILITY_IMAGE_LIST[3]],
-                STARTING_PRICE_LIST[3],
-                image_size,
-                CHARACTER_KEYS[player_sprite][STARTING_ABILITY_IMAGE_LIST[3]],
-            ),
+                name,
+                None if self.headless else LOADED_IMAGES[name],
+                price,
+                self.closed_dims,
+                CHARACTER_KEYS[player_sprite][name],
+            )
+            for name, price in zip(STARTING_ABILITY_IMAGE_LIST, STARTING_PRICE_LIST)
         ]
 
-    def draw_shop(self):
-        if self.open:
-            self.draw_open_shop()
-        else:
-            self.draw_closed_shop()
+    def card_rect(self, index):
+        """Where the card at index sits on the open shop, stacked from the bottom"""
+        padding = 0.1
+        offset = index + 0.5 + (padding * index)
+        rect = pg.Rect((0, 0), self.closed_dims)
+        rect.center = (
+            self.closed_dims[0] / 2,
+            self.open_surface.get_height() - self.closed_dims[1] * offset,
+        )
+        return rect
 
-    def draw_open_shop(self):
-        self.shop_surface.fill(self.shop_bg_color)
+    def compose_open_shop(self):
+        self.open_surface.fill(self.shop_bg_color)
+        for index, shop_card in enumerate(self.shop_card_list):
+            self.open_surface.blit(shop_card.image, self.card_rect(index))
 
-        padding = 0.1
-        for i, shop_card in enumerate(self.shop_card_list):
-            offset = i + 0.5 + (padding * i)
-            shop_icon_image_pos = shop_card.image.get_rect(
-                centerx=0 + shop_card.image.get_rect().width / 2,
-                centery=self.shop_surface.get_height()
-                - shop_card.image.get_rect().height * (offset),
-            )
-            self.shop_surface.blit(shop_card.image, shop_icon_image_pos)
+    def compose_closed_shop(self):
+        self.closed_surface.fill(self.shop_bg_color)
+        self.closed_surface.blit(self.shop_card_list[0].image, (0, 0))
 
-    def draw_closed_shop(self):
-        self.shop_surface.fill(self.shop_bg_color)
-        self.shop_surface.blit(
-            self.shop_card_list[0].image, self.shop_surface.get_rect()
-        )
+    def redraw_card(self, shop_card):
+        rect = self.card_rect(self.shop_card_list.index(shop_card))
+        self.open_surface.fill(self.shop_bg_color, rect)
+        self.open_surface.blit(shop_card.image, rect)
+        if shop_card is self.shop_card_list[0]:
+            self.compose_closed_shop()
 
     def toggle_open(self):
         if self.open:
-            self.shop_surface = self.closed_surface
-            self.open = False
+            self.close_shop()
         else:
             self.shop_surface = self.open_surface
             self.open = True
+            self.version += 1
 
     def close_shop(self):
+        if self.open:
+            self.version += 1
         self.shop_surface = self.closed_surface
         self.open = False
 
     def increase_price_of_power(self, power_name):
         for card in self.shop_card_list:
             if card.name == power_name:
-                card.set_price(card.price + 8)
+                self.set_price(card, card.price + 8)
+
+    def set_price(self, shop_card, price):
+        if price == shop_card.price:
+            return
+        shop_card.set_price(price)
+        if not self.headless:
+            self.redraw_card(shop_card)
+        self.version += 1
 
     def get_shopcard(self, name):
         for shop_card in self.shop_card_list:
@@ -115,10 +120,18 @@ class Shop:
 
 class ShopCard:
     def __init__(self, name, image, price, image_size, control="q"):
+        """image is None for headless shops, which only track prices.
+
+        base_image is the icon with its control key; image is base_image with
+        the current price, rebuilt from base_image whenever the price changes."""
         self.name = name
+        self.price = price
+        if image is None:
+            self.base_image = None
+            self.image = None
+            return
         self.base_image = pg.transform.scale(image, image_size)
         self.image = self.base_image
-        self.price = price
         self.price_base = pg.Surface((15, 10))
         self.price_base.fill(GOLD)
         self.font_name = "MomcakeBold-WyonA.otf"
@@ -127,16 +140,14 @@ class ShopCard:
 
     def set_control(self, control):
         if self.name != "shop_icon":
-            font = pg.font.Font(os.path.join(DATA_DIR, self.font_name), 18)
-            text_control = font.render(control, 1, (255, 255, 255))
+            text_control = render_text(self.font_name, 18, control, (255, 255, 255))
             text_pos = text_control.get_rect(
                 centerx=self.base_image.get_width() / 2,
                 centery=self.base_image.get_height() / 1.1,
             )
             self.base_image.blit(text_control, text_pos)
         else:
-            font = pg.font.Font(os.path.join(DATA_DIR, self.font_name), 36)
-            text_control = font.render(control, 1, WHITE)
+            text_control = render_text(self.font_name, 36, control, WHITE)
             text_pos = text_control.get_rect(
                 centerx=self.base_image.get_width() / 2,
                 centery=self.base_image.get_height() / 1.6,
@@ -145,10 +156,11 @@ class ShopCard:
 
     def set_price(self, price):
         self.price = price
-        if self.name != "shop_icon":
-
-            font = pg.font.Font(os.path.join(DATA_DIR, self.font_name), 18)
-            text_control = font.render(str(price), 1, BLACK)
+        if self.name != "shop_icon" and self.base_image is not None:
+            # base_image is RLE encoded, and copy() of it bakes the colorkey
+            # into alpha; a same-size scale copies the pixels and the colorkey
+            self.image = pg.transform.scale(self.base_image, self.base_image.get_size())
+            text_control = render_text(self.font_name, 18, str(price), BLACK)
             text_pos = text_control.get_rect(
                 centerx=self.base_image.get_width() / 1.5,
                 centery=self.base_image.get_height() / 5.8,
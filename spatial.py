@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+
+
+class SpatialGrid:
+    """Uniform grid over the wrap-around world for nearest neighbour queries.
+
+    Distances are measured on the torus that Entity.draw and get_center use,
+    so an enemy at the right edge is a neighbour of one at the left edge."""
+
+    def __init__(self, world_size, min_cell_size=32, points_per_cell=2):
+        self.world_size = np.asarray(world_size, dtype=float)
+        self.min_cell_size = min_cell_size
+        self.points_per_cell = points_per_cell
+        self.rebuild(np.zeros((0, 2)))
+
+    def rebuild(self, points):
+        """Index points (world coordinates) for this tick"""
+        self.points = np.asarray(points, dtype=float) % self.world_size
+
+        # size cells so that an even spread puts a couple of points in each
+        area = self.world_size[0] * self.world_size[1]
+        cell_size = (area * self.points_per_cell / max(1, len(self.points))) ** 0.5
+        cell_size = max(cell_size, self.min_cell_size)
+        self.cols = max(1, int(self.world_size[0] // cell_size))
+        self.rows = max(1, int(self.world_size[1] // cell_size))
+        # stretch the cells so they tile the world exactly and wrap cleanly
+        self.cell_size = self.world_size / (self.cols, self.rows)
+
+        cols, rows = self.cell_coords(self.points)
+        cells = rows * self.cols + cols
+        self.order = np.argsort(cells, kind="stable")
+        counts = np.bincount(cells, minlength=self.cols * self.rows)
+        self.starts = np.concatenate([[0], np.cumsum(counts)])
+        self.table = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def cell_coords(self, points):
+        cells = (points // self.cell_size).astype(int)
+        return cells[:, 0] % self.cols, cells[:, 1] % self.rows
+
+    def cell_members(self, col, row):
+        cell = (row % self.rows) * self.cols + (col % self.cols)
+        return self.order[self.starts[cell] : self.starts[cell + 1]]
+
+    def delta(self, a, b):
+        """Shortest vector from a to b on the torus"""
+        d = np.asarray(b, dtype=float) - np.asarray(a, dtype=float)
+        return d - self.world_size * np.round(d / self.world_size)
+
+    def nearest(self, indices):
+        """Nearest other point for each of the indexed points, as (index, distance).
+
+        Checks the surrounding 3x3 cells in one batch and falls back to a brute
+        force pass for the few points whose neighbourhood is not conclusive."""
+        indices = np.asarray(indices, dtype=int)
+        if len(self.points) < 2:
+            return (
+                np.full(len(indices), -1),
+                np.full(len(indices), math.inf),
+            )
+        if self.table is None:
+            self.table = self.occupancy_table()
+
+        cols, rows = self.cell_coords(self.points[indices])
+        offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        neighbour_cols = (cols[:, None] + offsets[:, 0]) % self.cols
+        neighbour_rows = (rows[:, None] + offsets[:, 1]) % self.rows
+        cells = neighbour_rows * self.cols + neighbour_cols
+        candidates = self.table[cells].reshape(len(indices), -1)
+
+        d = self.delta(self.points[indices][:, None, :], self.points[candidates])
+        dists = np.hypot(d[..., 0], d[..., 1])
+        dists[(candidates < 0) | (candidates == indices[:, None])] = math.inf
+        best = dists.argmin(axis=1)
+        nearest = candidates[np.arange(len(indices)), best]
+        nearest_dist = dists[np.arange(len(indices)), best]
+
+        unsure = np.flatnonzero(nearest_dist > self.cell_size.min())
+        if len(unsure):
+            d = self.delta(self.points[indices[unsure]][:, None, :], self.points)
+            dists = np.hypot(d[..., 0], d[..., 1])
+            dists[np.arange(len(unsure)), indices[unsure]] = math.inf
+            nearest[unsure] = dists.argmin(axis=1)
+            nearest_dist[unsure] = dists.min(axis=1)
+        return nearest, nearest_dist
+
+    def occupancy_table(self):
+        """Cell -> member indices, padded with -1 to the fullest cell"""
+        counts = np.diff(self.starts)
+        table = np.full((len(counts), max(1, counts.max())), -1)
+        slots = np.arange(len(self.order)) - np.repeat(self.starts[:-1], counts)
+        table[np.repeat(np.arange(len(counts)), counts), slots] = self.order
+        return table
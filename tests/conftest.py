@@ -0,0 +1,21 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import helper
+
+
+@pytest.fixture(scope="session")
+def display():
+    """A display to convert surfaces for, like the game's"""
+    pg.display.init()
+    pg.font.init()
+    helper.load_asset_manifest()
+    yield pg.display.set_mode(helper.WIN_SIZE)
+    pg.quit()
@@ -0,0 +1,25 @@
+from collision import PIT_FALL, CollisionSystem
+from world import World
+
+DIMS = (768, 432)
+
+
+def test_pit_falls_wrap_around_the_world_edge(display):
+    """An enemy past the edge still falls in a pit hanging over it"""
+    world = World(DIMS, "VIKING", headless=True, seed=3)
+    world.start()
+    pit = world.pit
+    # scroll so the pit's center lands just past the right edge of the world
+    world.background.position = [DIMS[0] + 10 - 3 * 48, 100 - 4.25 * 48]
+    world.place_static_things()
+    assert pit.position[0] < DIMS[0] < pit.position[0] + pit.get_width()
+
+    world.enemies.clear()
+    world.gen_enemy()
+    enemy = world.enemies.enemies[0]
+    # where the pit's center is drawn, on the left side of the world
+    enemy.set_position((10, 100))
+    world.player.set_position((DIMS[0] / 2, DIMS[1] / 2))
+
+    events = CollisionSystem(pit, DIMS).check(world.player, [], world.enemies)
+    assert events == [(PIT_FALL, enemy)]
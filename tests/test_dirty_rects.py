@@ -0,0 +1,34 @@
+import pygame as pg
+
+from world import World
+
+DIMS = (768, 432)
+
+
+def test_dirty_rects_cover_every_change(display):
+    """Pushing only dirty_rects shows the same frame as a full redraw,
+    including the frames where the HUD changes"""
+    world = World(DIMS, "VIKING", seed=7)
+    world.start()
+    for _ in range(20):
+        world.gen_enemy()
+    world.draw_world()
+    shown = world.world.copy()
+    hud_frames = 0
+    for tick in range(150):
+        if tick % 7 == 0:
+            world.money += 1
+        world.tick()
+        world.draw_world()
+        if world.dirty_rects is None:
+            shown = world.world.copy()
+        else:
+            hud_frames += tick % 7 == 0
+            for rect in world.dirty_rects:
+                shown.blit(world.world, rect, rect)
+        world.full_redraw = True
+        world.draw_world()
+        assert pg.image.tostring(shown, "RGB") == pg.image.tostring(
+            world.world, "RGB"
+        ), tick
+    assert hud_frames
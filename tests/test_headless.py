@@ -0,0 +1,24 @@
+from world import World
+
+DIMS = (768, 432)
+
+
+def test_headless_world_follows_the_drawn_rules(display):
+    """A headless world and a drawn one with the same seed and inputs stay in step"""
+    headless = World(DIMS, "VIKING", headless=True, seed=11)
+    drawn = World(DIMS, "VIKING", seed=11)
+    for world in [headless, drawn]:
+        world.start()
+        world.set_dir("LEFT", 1)
+        world.set_dir("UP", 1)
+    for tick in range(600):
+        if tick % 30 == 0:
+            headless.activate_power("more")
+            drawn.activate_power("more")
+        headless.tick()
+        drawn.tick()
+        drawn.draw_world()
+        assert headless.state_hash() == drawn.state_hash(), tick
+    for world in [headless, drawn]:
+        assert 0 <= world.pit.position[0] < DIMS[0]
+        assert 0 <= world.pit.position[1] < DIMS[1]
@@ -0,0 +1,49 @@
+import pytest
+
+import replay
+from world import World
+
+DIMS = (768, 432)
+TICKS = 900
+# held directions, changed every 150 ticks, that scroll the pit across the edges
+MOVES = ["UP", "LEFT", "DOWN", "RIGHT", "UP", "RIGHT"]
+
+
+def play(path, alpha, seed=5):
+    """Record a drawn two-world match, drawing every frame alpha into its tick"""
+    worlds = [
+        World(DIMS, theme, seed=seed + i) for i, theme in enumerate(["VIKING", "DEMON"])
+    ]
+    for world in worlds:
+        world.start()
+    recorder = replay.Recorder(str(path), worlds)
+    for tick in range(TICKS):
+        if tick % 150 == 0:
+            for world in worlds:
+                for name in ["UP", "DOWN", "LEFT", "RIGHT"]:
+                    world.set_dir(name, int(name == MOVES[tick // 150]))
+        if tick % 40 == 0:
+            worlds[1].activate_power("more")
+        for world in worlds:
+            world.tick()
+        recorder.end_tick()
+        for world in worlds:
+            world.draw_world(alpha)
+    recorder.close()
+
+
+@pytest.mark.parametrize("alpha", [1.0, 0.5])
+def test_replay_does_not_depend_on_drawing(display, tmp_path, alpha):
+    path = tmp_path / "match.rec"
+    play(path, alpha)
+    ticks, _ = replay.replay(str(path))
+    assert ticks == TICKS
+
+
+def test_recordings_do_not_depend_on_alpha(display, tmp_path):
+    recordings = []
+    for alpha in [1.0, 0.5, 0.999]:
+        path = tmp_path / "match_{}.rec".format(alpha)
+        play(path, alpha)
+        recordings.append(replay.read_recording(str(path))[1])
+    assert recordings[0] == recordings[1] == recordings[2]
@@ -0,0 +1,62 @@
+import numpy as np
+
+TICK_RATE = 60
+# simulation ticks run per drawn frame at most before the game slows down instead
+MAX_CATCH_UP_TICKS = 5
+# longest frame time fed to the accumulator, e.g. after a stall or dragging the window
+MAX_FRAME_TIME = 0.25
+# movement between two ticks longer than this is a respawn, not something to blend
+MAX_TICK_DISTANCE = 100
+
+
+class FixedTimestep:
+    """Accumulates real time and hands it out as whole simulation ticks.
+
+    Entity speeds are pixels per tick, so the game runs at the same speed
+    however fast frames are drawn. alpha() is how far real time has got into
+    the next tick, for interpolating what is drawn between two ticks."""
+
+    def __init__(self, tick_rate=TICK_RATE, max_ticks=MAX_CATCH_UP_TICKS):
+        self.tick_time = 1 / tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0
+        self.last_time = None
+        self.dropped_time = 0
+
+    def advance(self, now):
+        """Number of ticks to simulate for a frame drawn at time now (seconds)"""
+        if self.last_time is None:
+            self.last_time = now
+            return 0
+        frame_time = min(now - self.last_time, MAX_FRAME_TIME)
+        self.last_time = now
+        self.accumulator += frame_time
+
+        ticks = int(self.accumulator // self.tick_time)
+        self.accumulator -= ticks * self.tick_time
+        if ticks > self.max_ticks:
+            # too far behind to catch up, let the simulation fall back a little
+            self.dropped_time += (ticks - self.max_ticks) * self.tick_time
+            ticks = self.max_ticks
+        return ticks
+
+    def alpha(self):
+        return min(1.0, self.accumulator / self.tick_time)
+
+    def reset(self):
+        self.accumulator = 0
+        self.last_time = None
+
+
+def lerp_wrapped(previous, current, alpha, world_size):
+    """Positions alpha of the way from previous to current on the world torus.
+
+    Rows that moved further than MAX_TICK_DISTANCE, like a respawned coin, are
+    drawn where they are now rather than sliding across the world."""
+    previous = np.asarray(previous, dtype=float)
+    current = np.asarray(current, dtype=float)
+    world_size = np.asarray(world_size, dtype=float)
+    delta = current - previous
+    delta -= world_size * np.round(delta / world_size)
+    jumped = (np.abs(delta) > MAX_TICK_DISTANCE).any(axis=-1, keepdims=True)
+    return np.where(jumped, current, previous + delta * alpha)
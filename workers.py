@@ -0,0 +1,240 @@
+"""Simulate each player's World in its own process.
+
+A WorkerWorld is drawn in the main process like any World, but its headless
+twin in a worker process runs the game rules. After every tick the worker
+publishes positions, lives, money and shop state into a shared NumPy array
+that the main process copies into its own entities before drawing. Input,
+power purchases and theme changes travel to the worker on a command queue,
+in order, so a purchase is always applied before the next tick."""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import helper
+from enemies import FACING_CODES, FACINGS
+from world import THEMES, World, theme_sprite_names
+
+# most enemies a world publishes, further ones are simulated but not drawn
+ENEMY_CAPACITY = 16384
+COIN_CAPACITY = 64
+HEADER = [
+    "lives",
+    "money",
+    "shop_open",
+    "player_facing",
+    "background_x",
+    "background_y",
+    "enemies",
+    "coins",
+    "price_shop_icon",
+    "price_heal",
+    "price_speed",
+    "price_more",
+]
+FIELDS = {name: index for index, name in enumerate(HEADER)}
+# spawn keeps the worker free of the display and mixer state of the game process
+CONTEXT = multiprocessing.get_context("spawn")
+
+
+class SharedWorldState:
+    """One float64 array in shared memory: header, enemy rows, coin rows"""
+
+    def __init__(self, name=None):
+        size = (len(HEADER) + ENEMY_CAPACITY * 3 + COIN_CAPACITY * 2) * 8
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # workers share the game's resource tracker, which already knows
+            # the block; the creating process unlinks it in close()
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        values = np.ndarray(size // 8, dtype=np.float64, buffer=self.memory.buf)
+        self.header = values[: len(HEADER)]
+        start = len(HEADER)
+        self.enemies = values[start : start + ENEMY_CAPACITY * 3].reshape(-1, 3)
+        start += ENEMY_CAPACITY * 3
+        self.coins = values[start : start + COIN_CAPACITY * 2].reshape(-1, 2)
+
+    def publish(self, world):
+        header = self.header
+        header[FIELDS["lives"]] = world.player.lives
+        header[FIELDS["money"]] = world.money
+        header[FIELDS["shop_open"]] = world.shop.open
+        header[FIELDS["player_facing"]] = FACING_CODES[world.player.image]
+        header[FIELDS["background_x"] : FIELDS["background_y"] + 1] = (
+            world.background.position
+        )
+        for card in world.shop.shop_card_list:
+            header[FIELDS["price_" + card.name]] = card.price
+
+        n = min(len(world.enemies), ENEMY_CAPACITY)
+        header[FIELDS["enemies"]] = n
+        self.enemies[:n, :2] = world.enemies.positions[:n]
+        self.enemies[:n, 2] = world.enemies.facing[:n]
+
+        coins = world.coin_list[:COIN_CAPACITY]
+        header[FIELDS["coins"]] = len(coins)
+        if coins:
+            self.coins[: len(coins)] = [coin.position for coin in coins]
+
+    def close(self, unlink=False):
+        # the array views must go before the buffer they point into
+        self.header = self.enemies = self.coins = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def run_world(dims, theme, seed, sizes, state_name, commands, replies):
+    """Worker process body: a headless World driven by commands"""
+    helper.ASSET_SIZES.update(sizes)
+    state = SharedWorldState(state_name)
+    world = World(dims, theme, headless=True, seed=seed)
+    while True:
+        command, *args = commands.get()
+        if command == "stop":
+            break
+        elif command == "tick":
+            world.tick()
+        elif command == "set_dir":
+            world.set_dir(*args)
+        elif command == "toggle_shop":
+            world.toggle_shop()
+        elif command == "pay":
+            world.pay_for_power(*args)
+        elif command == "activate":
+            world.activate_power(*args)
+        elif command == "init_character":
+            world.init_character(*args)
+        elif command == "start":
+            world.start()
+        elif command == "reset":
+            world.reset()
+        else:
+            raise ValueError("No such world command {}".format(command))
+
+        if command in ["tick", "init_character", "start", "reset"]:
+            state.publish(world)
+            replies.put(world.events if command == "tick" else [])
+    state.close()
+
+
+class WorkerWorld(World):
+    """World drawn here and simulated by a headless World in a worker process"""
+
+    def __init__(self, dims, theme, seed=None, surface=None):
+        World.__init__(self, dims, theme, seed=seed, surface=surface)
+        sizes = {
+            name: helper.get_image_size(name)
+            for each_theme in THEMES
+            for name in theme_sprite_names(each_theme)
+        }
+        self.state = SharedWorldState()
+        self.commands = CONTEXT.Queue()
+        self.replies = CONTEXT.Queue()
+        self.process = CONTEXT.Process(
+            target=run_world,
+            args=(
+                dims,
+                theme,
+                self.seed,
+                sizes,
+                self.state.name,
+                self.commands,
+                self.replies,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+
+    def send(self, *command):
+        self.commands.put(command)
+
+    def request(self, *command):
+        """Run a command in the worker and wait for its state"""
+        self.send(*command)
+        self.finish_tick()
+
+    def start(self):
+        World.start(self)
+        self.request("start")
+
+    def tick(self):
+        """Start the worker's tick; finish_tick waits for it"""
+        self.save_positions()
+        self.send("tick")
+
+    def finish_tick(self):
+        for event in self.replies.get():
+            self.play_event_sound(event)
+        self.apply_state()
+
+    def apply_state(self):
+        """Copy what the worker published into the entities drawn here"""
+        header = self.state.header
+        self.player.lives = int(header[FIELDS["lives"]])
+        self.money = int(header[FIELDS["money"]])
+        if self.shop.open != bool(header[FIELDS["shop_open"]]):
+            self.shop.toggle_open()
+        for card in self.shop.shop_card_list:
+            price = int(header[FIELDS["price_" + card.name]])
+            self.shop.set_price(card, price)
+        self.player.image = FACINGS[int(header[FIELDS["player_facing"]])]
+        self.background.position = header[
+            FIELDS["background_x"] : FIELDS["background_y"] + 1
+        ].tolist()
+
+        n = int(header[FIELDS["enemies"]])
+        while len(self.enemy_list) < n:
+            self.gen_enemy()
+        self.enemies.positions[:n] = self.state.enemies[:n, :2]
+        self.enemies.facing[:n] = self.state.enemies[:n, 2]
+        for coin, position in zip(
+            self.coin_list, self.state.coins[: int(header[FIELDS["coins"]])].tolist()
+        ):
+            coin.position = position
+        self.place_static_things()
+
+    def set_dir(self, key, val):
+        World.set_dir(self, key, val)
+        self.send("set_dir", key, val)
+
+    def toggle_shop(self):
+        World.toggle_shop(self)
+        self.send("toggle_shop")
+
+    def pay_for_power(self, power_name):
+        """Decided on the last published state, which the worker can only exceed
+        since money is only ever spent through here"""
+        if World.pay_for_power(self, power_name):
+            self.send("pay", power_name)
+            return True
+        return False
+
+    def activate_power(self, power_name):
+        self.record("activate", power_name)
+        self.send("activate", power_name)
+
+    def init_character(self, theme):
+        World.init_character(self, theme)
+        self.request("init_character", theme)
+
+    def reset(self):
+        World.reset(self)
+        self.request("reset")
+
+    def close(self):
+        World.close(self)
+        self.send("stop")
+        self.process.join()
+        self.state.close(unlink=True)
+
+
+def tick_all(worlds):
+    """Tick every WorkerWorld at once and wait for all of them"""
+    for world in worlds:
+        world.tick()
+    for world in worlds:
+        world.finish_tick()
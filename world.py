@@ -1,15 +1,29 @@
 import random
+import zlib
+
+import numpy as np
 import pygame as pg
 from pygame.locals import *
-import os
 
+import batch
 import helper
-from helper import DATA_DIR, LOADED_IMAGES, load_sound
+from helper import LOADED_IMAGES, SOUNDS, render_text
 
+from collision import COIN_PICKUP, ENEMY_HIT, PIT_FALL, CollisionSystem
 from entity import Entity
+from enemies import Enemy, EnemyStore
+from profiler import PROFILER
 from shop import Shop
+from spatial import SpatialGrid
+from timestep import lerp_wrapped
 
 GOLD = (254, 224, 34)
+# sound and volume of each collision event
+EVENT_SOUNDS = {
+    COIN_PICKUP: ("coin_sound.wav", 0.05),
+    ENEMY_HIT: ("ouch.wav", 0.2),
+    PIT_FALL: ("pit_fall_down.wav", None),
+}
 THEMES = {
     "VIKING": {"player_sprite": "sprite_viking", "enemy_sprite": "sprite_demon"},
     "PRIEST": {"player_sprite": "sprite_priest", "enemy_sprite": "sprite_farmer"},
@@ -18,31 +32,66 @@ THEMES = {
 }
 
 
+def theme_sprite_names(theme):
+    """Every sprite a world of this theme puts in its playing field"""
+    names = ["sprite_coin", "pit_open", theme[0] + "pit"]
+    for sprite in THEMES[theme].values():
+        names += helper.create_sprite_dict(sprite).values()
+    return names
+
+
 class World:
-    def __init__(self, dims, theme):
+    def __init__(self, dims, theme, headless=False, seed=None, surface=None):
+        """headless worlds keep the game rules but never touch a Surface, font or sound.
+
+        Everything random in the world's simulation comes from seed, so the same
+        seed and inputs replay the same match, see replay.py. surface is where
+        the world is drawn, like a viewport of the screen from layout.Layout;
+        by default a surface of its own."""
         self.dims = dims
         self.theme = theme
+        self.start_theme = theme
+        self.headless = headless
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.random = random.Random(self.seed)
+        # set by replay.Recorder while a match is recorded
+        self.recorder = None
+        # position in Game.players, labels profiles and recordings
+        self.index = 0
         self.dir_dict = {"UP": 0, "DOWN": 0, "LEFT": 0, "RIGHT": 0}
         self.ready = False
+        # collision events of the last tick, see player_update
+        self.events = []
 
         self.coin_list = []
         self.enemy_list = []
-        self.allsprites = pg.sprite.RenderPlain()
-
-        self.world = pg.Surface(self.dims).convert()
-        self.shop = Shop(THEMES[theme]["player_sprite"], (60, 60))
+        self.enemies = EnemyStore(rng=np.random.default_rng(self.seed))
+        self.grid = SpatialGrid(dims)
+        self.allsprites = []
 
+        self.shop = Shop(THEMES[theme]["player_sprite"], (60, 60), headless=headless)
         self.money = 900
-        self.font_money = pg.font.Font(
-            os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 20 * 3
-        )
-        self.text_money = self.font_money.render(str(self.money), 1, (220, 20, 60))
 
-        self.ouch_sound = load_sound("ouch.wav")
-        self.ouch_sound.set_volume(0.2)
-        self.coin_sound = load_sound("coin_sound.wav")
-        self.coin_sound.set_volume(0.05)
-        self.pit_sound = load_sound("pit_fall_down.wav")
+        # dirty-rect state, see draw_world
+        self.full_redraw = True
+        self.dirty_rects = None
+        self.drawn_sprites = set()
+        self.drawn_background_position = None
+        self.drawn_hud = None
+        # lives, money and shop pre-composed, see update_gui
+        self.hud_layer = None
+        self.hud_rect = None
+        self.hud_layer_state = None
+        # positions at the start of the last tick, see draw_world
+        self.previous_positions = None
+
+        if headless:
+            self.world = None
+        else:
+            self.world = surface if surface is not None else pg.Surface(dims).convert()
+            self.batch = batch.SpriteBatch(self.sprite_atlas())
+            for name, volume in EVENT_SOUNDS.values():
+                SOUNDS.load(name, volume)
 
         # TODO: rename building files from pit to 'building'
         self.building = Entity({"DOWN": self.theme[0] + "pit"}, (0, 0))
@@ -52,15 +101,20 @@ class World:
             (self.dims[0] / 2, self.dims[1] / 2),
             lives=3,
         )
+        self.collisions = CollisionSystem(self.pit, self.dims)
 
         self.background = Entity(
-            helper.create_background(self.theme, self.dims),
+            self.create_background(),
             (dims[0] / 2 - 24, dims[1] / 2 - 70),
         )
 
-        self.draw_world()
+        if headless:
+            self.place_static_things()
+        else:
+            self.draw_world()
 
     def start(self):
+        self.start_theme = self.theme
         self.gen_enemy()
         # spawns 5 coin entities
         for i in range(5):
@@ -86,17 +140,40 @@ class World:
 
     def add_entity(self, sprite_dict, pos, ai=None, speed=5):
         entity = Entity(sprite_dict, pos, ai=ai, speed=speed)
-        self.allsprites.add(entity)
+        self.allsprites.append(entity)
         return entity
 
+    def create_background(self):
+        if self.headless:
+            return helper.create_headless_background(self.dims)
+        return helper.create_background(self.theme, self.dims, self.seed)
+
+    def sprite_atlas(self):
+        """Atlas of every sprite this theme draws through the batch"""
+        return batch.get_atlas(self.theme, theme_sprite_names(self.theme))
+
+    def release_background(self, sprite_dict):
+        if not self.headless:
+            helper.release_background(sprite_dict)
+
+    def close(self):
+        """Give shared resources back once the world is no longer used"""
+        self.release_background(self.background.sprite_dict)
+
     def init_character(self, theme):
         """Clean me or rename change_theme"""
         self.theme = theme
-        del LOADED_IMAGES[self.background.get_sprite_id()]
+        self.full_redraw = True
+        self.previous_positions = None
+        if not self.headless:
+            helper.prefetch_theme(theme)
+            self.batch.atlas = self.sprite_atlas()
+        old_background = self.background.sprite_dict
         self.background = Entity(
-            helper.create_background(self.theme, self.dims),
+            self.create_background(),
             (self.dims[0] / 2 - 24, self.dims[1] / 2 - 70),
         )
+        self.release_background(old_background)
         self.player.set_sprite_dict(
             helper.create_sprite_dict(THEMES[theme]["player_sprite"])
         )
@@ -106,128 +183,263 @@ class World:
         self.building.set_sprite_dict({"DOWN": self.theme[0] + "pit"})
         self.pit.set_sprite_dict({"DOWN": "pit_open"})
 
-    def draw_world(self):
-        """Clean me"""
-        self.background.draw(self.world, self.dims)
-        if not self.player.is_alive():
-            self.player.image = "DEAD"
-
-        for sprite in self.allsprites:
-            sprite.draw(self.world, self.dims)
-
-        self.world.blit(self.player.get_sprite(), self.player.get_position())
-
-        # Draws the building
-        self.draw_static_thing(8.5, 4.25, self.building)
+    def draw_world(self, alpha=1.0):
+        """Redraw the world surface and set dirty_rects to the regions that changed.
+
+        dirty_rects is None when the whole surface changed, which is every frame
+        the background scrolls. Otherwise only the old positions of moved sprites
+        are restored from the background before the sprites are drawn again,
+        and only rects whose sprite moved or changed image are reported. When
+        hud_state changes the HUD's old rect is restored too, and both its old
+        and new rects are reported.
+
+        alpha is how far the frame is between the last tick and the next one;
+        everything is drawn that far along from where the last tick found it."""
+        simulated = self.interpolate(alpha)
+
+        hud = self.hud_state()
+        hud_changed = hud != self.drawn_hud
+        drawn_hud_rect = self.hud_rect
+        full_redraw = (
+            self.full_redraw
+            or tuple(self.background.position) != self.drawn_background_position
+        )
+        if full_redraw:
+            self.background.draw(self.world, self.dims)
+        else:
+            stale = [rect for rect, _ in self.drawn_sprites]
+            if hud_changed and drawn_hud_rect is not None:
+                stale.append(drawn_hud_rect)
+            self.restore_background(stale)
+
+        for coin in self.coin_list:
+            self.batch.add_entity(coin, self.dims)
+        self.batch.add_enemies(self.enemies, self.dims)
+        self.batch.add(self.player.get_sprite_id(), self.player.get_position())
+        self.place_static_things()
+        self.batch.add_entity(self.building, self.dims)
+        self.batch.add_entity(self.pit, self.dims)
+        drawn_sprites = {
+            (tuple(rect), name) for rect, name in self.batch.flush(self.world)
+        }
+
+        if full_redraw:
+            self.dirty_rects = None
+        else:
+            # sprites that did not move or turn were redrawn over identical pixels
+            changed = drawn_sprites ^ self.drawn_sprites
+            self.dirty_rects = [pg.Rect(rect) for rect, _ in changed]
+
+        self.update_gui(hud)
+        if self.dirty_rects is not None and hud_changed:
+            self.dirty_rects.append(self.hud_rect.copy())
+            if drawn_hud_rect is not None:
+                self.dirty_rects.append(drawn_hud_rect)
+
+        self.full_redraw = False
+        self.drawn_sprites = drawn_sprites
+        self.drawn_background_position = tuple(self.background.position)
+        self.drawn_hud = hud
+        self.restore_positions(simulated)
+
+    def restore_background(self, rects):
+        """Copy the background back over rects of the world, straight from the
+        background sprite at the offsets its wrap-around copies were drawn at"""
+        image = self.background.get_sprite()
+        copies = [
+            pg.Rect(position, image.get_size())
+            for position in self.background.draw_positions(self.dims)
+        ]
+        for rect in rects:
+            for copy in copies:
+                area = copy.clip(rect)
+                if area:
+                    self.world.blit(image, area, area.move(-copy.x, -copy.y))
+
+    def save_positions(self):
+        self.previous_positions = (
+            self.enemies.positions[: self.enemies.count].copy(),
+            [list(coin.position) for coin in self.coin_list],
+            list(self.background.position),
+        )
 
-        self.draw_static_thing(3, 4.25, self.pit)
+    def interpolate(self, alpha):
+        """Blend positions between the last two ticks for drawing.
+
+        Returns the simulated positions for restore_positions, or None when
+        there is nothing to blend."""
+        if self.previous_positions is None or alpha >= 1:
+            return None
+        enemies, coins, background = self.previous_positions
+        simulated = (
+            self.enemies.positions[: self.enemies.count].copy(),
+            [list(coin.position) for coin in self.coin_list],
+            list(self.background.position),
+        )
 
-        self.update_gui()
-        # pg.display.flip()
+        n = min(len(enemies), self.enemies.count)
+        self.enemies.positions[:n] = lerp_wrapped(
+            enemies[:n], simulated[0][:n], alpha, self.dims
+        )
+        n = min(len(coins), len(self.coin_list))
+        if n:
+            blended = lerp_wrapped(coins[:n], simulated[1][:n], alpha, self.dims)
+            for coin, position in zip(self.coin_list, blended.tolist()):
+                coin.position = position
+        self.background.position = lerp_wrapped(
+            background, simulated[2], alpha, self.dims
+        ).tolist()
+        return simulated
+
+    def restore_positions(self, simulated):
+        if simulated is None:
+            return
+        enemies, coins, background = simulated
+        self.enemies.positions[: len(enemies)] = enemies
+        for coin, position in zip(self.coin_list, coins):
+            coin.position = position
+        self.background.position = background
+        self.place_static_things()
+
+    def hud_state(self):
+        return (
+            self.player.lives,
+            self.money,
+            self.shop.version,
+        )
 
-    def draw_static_thing(self, x_add_coord, y_add_coord, thing):
+    def place_static_thing(self, x_add_coord, y_add_coord, thing):
         """Hardcoded location. Fix by initialising entity with location in pit.info dictionary"""
         x, y = self.background.position
         x += x_add_coord * 48
         y += y_add_coord * 48
         thing.set_position((x, y))
-        thing.draw(self.world, self.dims)
+        # the rules see the same wrapped spot that draw_positions draws at
+        thing.wrap(self.dims)
+
+    def place_static_things(self):
+        """Put the building and pit at their spots on the scrolling background"""
+        self.place_static_thing(8.5, 4.25, self.building)
+        self.place_static_thing(3, 4.25, self.pit)
 
     def draw_select(self):
-        """Clean me by helper data font loading"""
-        font_select = pg.font.Font(os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 36 * 3)
-        text_select = font_select.render("Choose Your Character", 1, (220, 20, 60))
+        self.full_redraw = True
+        text_select = render_text(
+            "Amatic-Bold.ttf", 36 * 3, "Choose Your Character", (220, 20, 60)
+        )
         textpos_select = text_select.get_rect(
             centerx=self.get_width() / 2, centery=self.get_height() / 5
         )
         self.world.blit(text_select, textpos_select)
 
         if self.ready:
-            font_space_to_begin = pg.font.Font(
-                os.path.join(DATA_DIR, "AmaticSC-Regular.ttf"), 16 * 3
+            text_space_to_begin = render_text(
+                "AmaticSC-Regular.ttf", 16 * 3, "Ready!", (220, 20, 60)
             )
-            text_space_to_begin = font_space_to_begin.render("Ready!", 1, (220, 20, 60))
             textpos_space_to_begin = text_space_to_begin.get_rect(
                 centerx=self.get_width() / 2, centery=self.get_height() / 1.2
             )
             self.world.blit(text_space_to_begin, textpos_space_to_begin)
         else:
 
-            font_select = pg.font.Font(
-                os.path.join(DATA_DIR, "Amatic-Bold.ttf"), 24 * 3
+            text_select = render_text(
+                "Amatic-Bold.ttf", 24 * 3, "<       >", (220, 20, 60)
             )
-            text_select = font_select.render("<       >", 1, (220, 20, 60))
             textpos_select = text_select.get_rect(
                 centerx=self.get_width() / 2, centery=self.get_height() / 2
             )
             self.world.blit(text_select, textpos_select)
 
-            font_space_to_begin = pg.font.Font(
-                os.path.join(DATA_DIR, "AmaticSC-Regular.ttf"), 16 * 3
-            )
-            text_space_to_begin = font_space_to_begin.render(
-                "Press [shop button] when Ready", 1, (220, 20, 60)
+            text_space_to_begin = render_text(
+                "AmaticSC-Regular.ttf",
+                16 * 3,
+                "Press [shop button] when Ready",
+                (220, 20, 60),
             )
             textpos_space_to_begin = text_space_to_begin.get_rect(
                 centerx=self.get_width() / 2, centery=self.get_height() / 1.2
             )
             self.world.blit(text_space_to_begin, textpos_space_to_begin)
 
+    def tick(self):
+        """One fixed simulation step, see timestep.FixedTimestep"""
+        self.save_positions()
+        with PROFILER.phase("move", self.index):
+            self.move()
+        self.update_world()
+
     def update_world(self):
-        self.player_update()
-        for sprite in self.allsprites:
-            sprite.move(self.dims)
-        self.draw_world()
+        with PROFILER.phase("collisions", self.index):
+            self.player_update()
+        with PROFILER.phase("ai", self.index):
+            if self.enemies.uses_ai("distance"):
+                self.grid.rebuild(self.enemies.centers(self.dims))
+            self.enemies.step(self.dims, self.player.get_center(self.dims), self.grid)
+            self.enemies.wrap(self.dims)
+        for coin in self.coin_list:
+            coin.wrap(self.dims)
+        self.background.wrap(self.dims)
+        self.place_static_things()
 
     def player_update(self):
+        self.events = []
         if self.player.is_alive():
-            for coin in self.coin_list:
-                if self.player.check_collision(coin):
+            events = self.collisions.check(self.player, self.coin_list, self.enemies)
+            for event, entity in events:
+                self.reset_entity(entity)
+                if event == COIN_PICKUP:
                     self.money += 1
-                    self.coin_sound.play()
-                    self.reset_entity(coin)
-            for enemy in self.enemy_list:
-                if self.player.check_collision(enemy):
-                    self.reset_entity(enemy)
+                elif event == ENEMY_HIT:
                     self.player.lives -= 1
-                    self.ouch_sound.play()
-                if self.pit.check_collision(enemy):
-                    self.reset_entity(enemy)
-                    self.pit_sound.play()
+                self.play_event_sound(event)
+                self.events.append(event)
+        if not self.player.is_alive():
+            self.player.image = "DEAD"
 
-    def update_gui(self):
-        self.update_lives()
-        self.update_shop()
-        self.update_money()
+    def play_event_sound(self, event):
+        """Cue the event's sound, played once per tick however many worlds cue it"""
+        if not self.headless:
+            SOUNDS.cue(EVENT_SOUNDS[event][0])
+
+    def update_gui(self, hud):
+        """Blit the HUD layer, rendering it again only when hud_state changed.
+
+        The layer is run-length encoded, so the one blit skips its transparent
+        pixels. Hearts are copied onto it with BLEND_RGBA_MAX, which keeps their
+        alpha instead of blending them with the transparent layer."""
+        if hud != self.hud_layer_state:
+            # a new surface, drawing on the run-length encoded one is lossy
+            self.hud_layer = pg.Surface(self.dims, pg.SRCALPHA).convert_alpha()
+            self.update_lives()
+            self.update_shop()
+            self.update_money()
+            self.hud_rect = self.hud_layer.get_bounding_rect()
+            self.hud_layer.set_alpha(255, pg.RLEACCEL)
+            self.hud_layer_state = hud
+        self.world.blit(self.hud_layer, self.hud_rect, self.hud_rect)
 
     def update_money(self):
-        self.text_money = self.font_money.render(str(self.money), 1, (220, 20, 60))
-        textpos_money = self.text_money.get_rect(
-            topright=((self.world.get_width() - 20), 20)
+        text_money = render_text(
+            "Amatic-Bold.ttf", 20 * 3, str(self.money), (220, 20, 60)
         )
-        pg.draw.circle(self.world, GOLD, textpos_money.center, 40)
-        self.world.blit(self.text_money, textpos_money)
+        textpos_money = text_money.get_rect(topright=((self.dims[0] - 20), 20))
+        pg.draw.circle(self.hud_layer, GOLD, textpos_money.center, 40)
+        self.hud_layer.blit(text_money, textpos_money)
 
     def update_shop(self):
-        self.shop.draw_shop()
-        self.world.blit(self.shop.shop_surface, (0, 0))
+        self.hud_layer.blit(self.shop.shop_surface, (0, 0))
 
     def update_lives(self):
         full_heart = LOADED_IMAGES["sprite_heart"]
         empty_heart = LOADED_IMAGES["sprite_heart_empty"]
-        heart_positions = [
-            self.world.get_width() / 2 + full_heart.get_rect().width * -1.5,
-            self.world.get_width() / 2 + full_heart.get_rect().width * -0.5,
-            self.world.get_width() / 2 + full_heart.get_rect().width * 0.5,
-        ]
-
-        counter = 0
-        for heart_pos in heart_positions:
-            if self.player.lives > counter:
-                self.world.blit(full_heart, [int(heart_pos), 0])
-            else:
-                self.world.blit(empty_heart, [int(heart_pos), 0])
-            counter += 1
+        width = full_heart.get_width()
+        for counter, offset in enumerate([-1.5, -0.5, 0.5]):
+            heart = full_heart if self.player.lives > counter else empty_heart
+            self.hud_layer.blit(
+                heart,
+                [int(self.dims[0] / 2 + width * offset), 0],
+                special_flags=pg.BLEND_RGBA_MAX,
+            )
 
     def move(self):
         """Move player, by moving everything except player based on currently held buttons"""
@@ -240,14 +452,18 @@ class World:
                 return
             x = x / norm
             y = y / norm
-            for sprite in self.allsprites:
-                sprite.slide([x, y])
-                self.player.set_dir([x, y])
+            self.enemies.slide((x, y))
+            for coin in self.coin_list:
+                coin.slide([x, y])
+            self.player.set_dir([x, y])
             self.background.slide([x, y])
 
     def get_random_edge_pos(self):
-        return random.choice(
-            [(random.randint(0, self.dims[0]), 0), (0, random.randint(1, self.dims[1]))]
+        return self.random.choice(
+            [
+                (self.random.randint(0, self.dims[0]), 0),
+                (0, self.random.randint(1, self.dims[1])),
+            ]
         )
 
     def gen_coin(self):
@@ -259,12 +475,14 @@ class World:
         enemy_sprite_dict = helper.create_sprite_dict(
             THEMES[self.theme]["enemy_sprite"]
         )
-        enemy = self.add_entity(
-            enemy_sprite_dict, self.get_random_edge_pos(), ai="follow", speed=speed
-        )
-        enemy.update_info(
-            {"target": self.player, "me": enemy, "distance": self.enemy_list}
+        enemy = Enemy(
+            self.enemies,
+            enemy_sprite_dict,
+            self.get_random_edge_pos(),
+            speed=speed,
+            ai="follow",
         )
+        self.allsprites.append(enemy)
         self.enemy_list.append(enemy)
 
     def reset_entity(self, entity):
@@ -304,11 +522,14 @@ class World:
                 else:
                     self.dir_dict["UP"] = abs(val)
                     self.dir_dict["DOWN"] = 0
+        self.record(
+            "direction", *(self.dir_dict[d] for d in ["UP", "DOWN", "LEFT", "RIGHT"])
+        )
 
     def activate_power(self, power_name):
+        self.record("activate", power_name)
         if power_name == "speed":
-            for enemy in self.enemy_list:
-                enemy.speed += 0.3
+            self.enemies.add_speed(0.3)
 
         elif power_name == "more":
             self.gen_enemy()
@@ -316,6 +537,10 @@ class World:
         elif power_name == "heal":
             self.player.lives += 1
 
+    def toggle_shop(self):
+        self.record("toggle_shop")
+        self.shop.toggle_open()
+
     def pay_for_power(self, power_name):
         if not self.shop.open or (
             power_name == "heal" and self.player.max_lives == self.player.lives
@@ -327,12 +552,36 @@ class World:
                 self.money -= shop_power.price
                 if power_name not in ["more"]:
                     self.shop.increase_price_of_power(power_name)
+                self.record("pay", power_name)
                 return True
             return False
 
+    def record(self, command, *args):
+        if self.recorder is not None:
+            self.recorder.record(self.index, command, *args)
+
+    def state_hash(self):
+        """crc32 of the simulated state players can see, compared by replays"""
+        n = self.enemies.count
+        coins = np.array([coin.position for coin in self.coin_list], dtype=float)
+        summary = (
+            self.player.lives,
+            self.money,
+            self.shop.open,
+            [float(x) for x in self.background.position],
+            [card.price for card in self.shop.shop_card_list],
+        )
+        crc = zlib.crc32(self.enemies.positions[:n].tobytes())
+        crc = zlib.crc32(self.enemies.facing[:n].tobytes(), crc)
+        crc = zlib.crc32(coins.tobytes(), crc)
+        return zlib.crc32(repr(summary).encode(), crc)
+
     def reset(self):
         self.player.lives = 3
         self.money = 0
         self.enemy_list = []
-        self.allsprites.empty()
+        self.enemies.clear()
+        self.allsprites.clear()
+        self.full_redraw = True
+        self.previous_positions = None
         self.shop.close_shop()